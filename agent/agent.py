@@ -1,61 +1,216 @@
 from __future__ import annotations
 import asyncio
-from tkinter import N
+from pathlib import Path
 from typing import AsyncGenerator
 
-from regex import T
+from agent.budget import Budget, BudgetTracker, TurnUsage, UsageLedger
 from agent.event import AgentEvent,AgentEventType
 
 from client.llm_client import LLMClient
-from client.response import StreamEventType
+from client.pricing import get_price_table
+from client.response import StreamEventType, TokenUsage, ToolCall
+from context.compaction import ContextCompactor
+from context.journal import SessionJournal
 from context.manager import ContextManager
+from tools.base import ToolResults
 from tools.registry import create_default_registry
+from tools.scheduler import ToolScheduler
+from utils import startup
+from utils.text import count_tokens
+from utils.tracing import NOOP_SPAN, Span, get_tracer
 
 
 class Agent:
 
-    def __init__(self):
-        self.client = LLMClient()
+    MAX_TURNS = 50
+    WRAP_UP_NOTE = ("[budget] This task is close to its budget. Do not start new work; "
+                    "give your final answer now.")
+
+    def __init__(self, cwd : Path | None = None, client : LLMClient | None = None,
+                 budget : Budget | None = None, journal : SessionJournal | None = None):
+        self.client = client or LLMClient()
         self.context_manager = ContextManager()
+        self.compactor = ContextCompactor(self.client, self.context_manager, on_usage=self._record_compaction)
         self.tool_registry = create_default_registry()
+        self.tool_scheduler = ToolScheduler(self.tool_registry, cwd or Path.cwd())
+        self.budget = budget or Budget.from_env()
+        # usage of the latest run, and of every run in this session
+        self.usage = TokenUsage()
+        self.session = UsageLedger()
+        self._tracker : BudgetTracker | None = None
+        # resumes the journal's history, if any, and records everything after
+        self.journal = journal
+        if journal is not None:
+            journal.restore(self.context_manager)
 
 
     async def run(self,message : str):
 
         final_response = ""
-        yield AgentEvent.agent_start(message)
-        self.context_manager.add_user_(message)
-        async for event in self._agentic_loop():
-            yield event
-
-            if event.type == AgentEventType.TEXT_COMPLETE:
-                final_response = event.data.get("content")
-
-        yield AgentEvent.agent_end(final_response)
+        self.usage = TokenUsage()
+        tracker = self._tracker = BudgetTracker(self.budget)
+        span = get_tracer().start_span("agent.run", **{"agent.message_chars": len(message)})
+        try:
+            yield AgentEvent.agent_start(message)
+            if self.journal is not None:
+                self.journal.set_title(message)
+            self.context_manager.add_user_(message)
+            async for event in self._agentic_loop(tracker, span):
+                yield event
+
+                if event.type == AgentEventType.TEXT_COMPLETE:
+                    final_response = event.content
+                elif event.type == AgentEventType.AGENT_ERROR:
+                    span.set_error(event.data.get("error") or "Unknown error")
+
+            # summarize ahead of time while the user reads the answer
+            self.compactor.schedule()
+            self.usage = tracker.ledger.usage
+            span.set(**{"gen_ai.usage.input_tokens": self.usage.prompt_tokens,
+                        "gen_ai.usage.output_tokens": self.usage.completion_tokens,
+                        "llm.cached_tokens": self.usage.cached_tokens,
+                        "llm.cost_usd": tracker.ledger.cost})
+            yield AgentEvent.agent_end(final_response, self.usage, tracker.summary())
+        finally:
+            self._tracker = None
+            self.session.merge(tracker.ledger)
+            if self.journal is not None:
+                await self.journal.commit()
+            span.end()
 
         
 
-    async def _agentic_loop(self) -> AsyncGenerator[AgentEvent]:
-        response_text = ""
+    async def _agentic_loop(self, tracker : BudgetTracker, run_span : Span = NOOP_SPAN) -> AsyncGenerator[AgentEvent]:
         
         tool_schemas = self.tool_registry.get_schemas()
+        self.context_manager.set_tool_schemas(tool_schemas)
         
-        async for event in self.client.chat_completion(self.context_manager.get_messages(),tools=tool_schemas if tool_schemas else None, stream=True):
-            if event.type == StreamEventType.TEXT_DELTA:
-                if event.text_delta : 
-                    content = event.text_delta.content
-                    response_text += content
-                    yield AgentEvent.text_delta(content)
+        for turn in range(self.MAX_TURNS):
+            response_text = ""
+            tool_calls : list[ToolCall] = []
+            started : dict[str, asyncio.Task[ToolResults]] = {}
+            barrier_seen = False
+            
+            exceeded = tracker.exceeded()
+            if exceeded:
+                run_span.event("budget_exceeded", kind=exceeded.kind, used=exceeded.used, limit=exceeded.limit)
+                yield AgentEvent.budget_exceeded(exceeded.message, tracker.summary(exceeded))
+                return
+            
+            turn_span = run_span.child("agent.turn", **{"agent.turn": turn})
+            try:
+                with turn_span.child("context.build") as context_span:
+                    generation = self.context_manager.generation
+                    await self.compactor.compact_if_needed()
+                    messages = self.context_manager.get_messages()
+                    context_span.set(**{"context.messages": len(messages),
+                                        "context.tokens": self.context_manager.total_tokens,
+                                        "context.compacted": generation != self.context_manager.generation})
+                startup.mark("first request")
+                
+                estimated_input = self.context_manager.total_tokens
+                stream = self.client.chat_completion(messages,tools=tool_schemas if tool_schemas else None, stream=True,
+                                                     estimated_tokens=estimated_input,
+                                                     parent_span=turn_span)
+                while True:
+                    # the time limit also cuts off a stalled stream, not just
+                    # a slow one; events are yielded outside the timeout
+                    try:
+                        async with asyncio.timeout(tracker.remaining):
+                            event = await anext(stream)
+                    except StopAsyncIteration:
+                        break
+                    except TimeoutError:
+                        await stream.aclose()
+                        if response_text:
+                            self.context_manager.add_assistant_messages(response_text)
+                        exceeded = tracker.deadline_exceeded()
+                        run_span.event("budget_exceeded", kind=exceeded.kind, used=exceeded.used, limit=exceeded.limit)
+                        yield AgentEvent.budget_exceeded(exceeded.message, tracker.summary(exceeded))
+                        return
+                    
+                    if event.type == StreamEventType.TEXT_DELTA:
+                        if event.text_delta : 
+                            content = event.text_delta.content
+                            response_text += content
+                            yield AgentEvent.text_delta(content)
+
+                    elif event.type == StreamEventType.TOOL_CALL_COMPLETE and event.tool_call:
+                        call = event.tool_call
+                        yield AgentEvent.tool_call_start(call)
+                        # side-effect free calls start while the model keeps
+                        # generating, unless a mutating call came before them
+                        if not self.tool_scheduler.is_parallel_safe(call):
+                            barrier_seen = True
+                        elif not barrier_seen and call.call_id not in started:
+                            started[call.call_id] = self.tool_scheduler.start(call, turn_span)
+
+                    elif event.type == StreamEventType.MESSAGE_COMPLETE:
+                        tool_calls = event.tool_calls
+                        if event.usage:
+                            tracker.record(turn, event.model, event.usage)
+                        else:
+                            tracker.record(turn, event.model,
+                                           self._estimate_usage(estimated_input, response_text, tool_calls),
+                                           estimated=True)
+
+                    elif event.type == StreamEventType.ERROR:
+                        turn_span.set_error(event.error or "Unknown error")
+                        yield AgentEvent.agent_error(event.error or "Unknown error")
+                        return
+                        
+                self.context_manager.add_assistant_messages( response_text or None,
+                                                             [call.to_dict() for call in tool_calls])
+                turn_span.set(**{"agent.tool_calls": len(tool_calls)})
+                if response_text:
+                    yield AgentEvent.text_complete(content=response_text)
+                    
+                if not tool_calls:
+                    return
+                
+                # results come back in call order regardless of how they were scheduled
+                try:
+                    async with asyncio.timeout(tracker.remaining):
+                        results = await self.tool_scheduler.run(tool_calls, started, turn_span)
+                    started.clear()
+                except TimeoutError:
+                    # unfinished calls are cancelled below; the next turn
+                    # reports the exceeded budget
+                    exceeded = tracker.deadline_exceeded()
+                    results = [ToolResults.error_results(f"Stopped : {exceeded.message}") for _ in tool_calls]
+            finally:
+                for task in started.values():
+                    task.cancel()
+                turn_span.end()
+                    
+            for call, result in zip(tool_calls, results):
+                self.context_manager.add_tool_result(call.call_id, result.to_model_output())
+                yield AgentEvent.tool_call_complete(call, result)
+            if self.journal is not None:
+                await self.journal.commit()
+                
+            warning = tracker.should_warn()
+            if warning:
+                yield AgentEvent.budget_warning(warning.message, tracker.summary())
+                self.context_manager.add_user_(self.WRAP_UP_NOTE)
+                
+        yield AgentEvent.agent_error(f"Stopped after {self.MAX_TURNS} turns without a final answer")
 
 
-            elif event.type == StreamEventType.ERROR:
-                yield AgentEvent.agent_error(event.error or "Unknown error")
-                
-        self.context_manager.add_assistant_messages( response_text or None)
-        if response_text:
-            yield AgentEvent.text_complete(content=response_text)
 
+    def _record_compaction(self, model : str | None, usage : TokenUsage) -> None:
+        # summaries prefetched after a run ends are billed to the session
+        if self._tracker is not None:
+            self._tracker.record(-1, model, usage, kind="compaction")
+        else:
+            self.session.record(TurnUsage(turn=-1, model=model, usage=usage,
+                                          cost=get_price_table().cost(model, usage), kind="compaction"))
 
+    def _estimate_usage(self, input_tokens : int, response_text : str, tool_calls : list[ToolCall]) -> TokenUsage:
+        # for providers that do not report usage; budgets still need a number
+        output_tokens = count_tokens(response_text) + sum(count_tokens(call.raw_arguments) for call in tool_calls)
+        return TokenUsage(prompt_tokens=input_tokens, completion_tokens=output_tokens,
+                          total_tokens=input_tokens + output_tokens)
 
     async def __aenter__(self) -> Agent:
         return self
@@ -65,6 +220,9 @@ class Agent:
         exc_type,
         exc_val,
         exc_tb) -> None:
+        await self.compactor.close()
+        if self.journal is not None:
+            self.journal.close()
         if self.client:
             await self.client.close()
             self.client = None
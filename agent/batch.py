@@ -0,0 +1,198 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from contextlib import aclosing
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from agent.agent import Agent
+from agent.budget import Budget, UsageLedger
+from agent.event import AgentEventType
+from client.llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchTask:
+    task_id : str
+    prompt : str
+    cwd : Optional[Path] = None
+
+    @classmethod
+    def from_line(cls, line_number : int, line : str) -> BatchTask:
+        data = json.loads(line)
+        if isinstance(data, str):
+            data = {"prompt": data}
+        if not isinstance(data, dict):
+            raise ValueError(f"expected an object or a string, got {type(data).__name__}")
+        if not isinstance(data.get("prompt"), str):
+            raise ValueError("prompt must be a string")
+        return cls(task_id=str(data.get("id", line_number)),
+                   prompt=data["prompt"],
+                   cwd=Path(data["cwd"]).expanduser() if data.get("cwd") else None)
+
+
+@dataclass
+class BatchResult:
+    task_id : str
+    status : str
+    response : Optional[str] = None
+    error : Optional[str] = None
+    metrics : dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class BatchSummary:
+    total : int = 0
+    skipped : int = 0
+    succeeded : int = 0
+    failed : int = 0
+    wall_seconds : float = 0.0
+    # usage and cost of the tasks run by this invocation
+    ledger : UsageLedger = field(default_factory=UsageLedger)
+
+    @property
+    def usage(self):
+        return self.ledger.usage
+
+    @property
+    def cost(self) -> float:
+        return self.ledger.cost
+
+
+class BatchRunner:
+
+    DEFAULT_CONCURRENCY = 4
+    # results with these statuses are run again on the next invocation
+    RETRY_STATUSES = {"error"}
+
+    def __init__(self, input_path : Path, output_path : Path,
+                 concurrency : int = DEFAULT_CONCURRENCY,
+                 task_timeout : Optional[float] = None,
+                 client : Optional[LLMClient] = None,
+                 budget : Optional[Budget] = None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.concurrency = max(1, concurrency)
+        self.task_timeout = task_timeout
+        # applies to each task on its own
+        self.budget = budget
+        # one client for every session: they share the connection pool,
+        # rate limiter and tokenizer cache
+        self.client = client or LLMClient()
+        self.summary = BatchSummary()
+
+    def completed_ids(self) -> set[str]:
+        if not self.output_path.exists():
+            return set()
+
+        # the last result of a task wins; a retried task appends a new line
+        statuses : dict[str, str] = {}
+        with open(self.output_path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                # a crash mid-write leaves a partial last line; drop it
+                f.truncate(end)
+            for line in data[:end].splitlines():
+                try:
+                    result = json.loads(line)
+                    statuses[str(result["task_id"])] = result.get("status", "ok")
+                except (ValueError, KeyError):
+                    continue
+        return {task_id for task_id, status in statuses.items() if status not in self.RETRY_STATUSES}
+
+    def load_tasks(self) -> Iterator[BatchTask]:
+        with open(self.input_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield BatchTask.from_line(line_number, line)
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skipping invalid batch line {line_number} : {e}")
+
+    async def run(self) -> BatchSummary:
+        started = time.perf_counter()
+        completed = self.completed_ids()
+        pending : list[BatchTask] = []
+        for task in self.load_tasks():
+            self.summary.total += 1
+            if task.task_id in completed:
+                self.summary.skipped += 1
+            else:
+                pending.append(task)
+
+        self.client.warm_up()
+        queue = iter(pending)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.output_path, "a", encoding="utf-8") as output:
+
+            async def worker():
+                for task in queue:
+                    result = await self._run_task(task)
+                    # one line per finished task, flushed so a crash loses at
+                    # most the tasks still in flight
+                    output.write(json.dumps(result.to_dict()) + "\n")
+                    output.flush()
+                    if result.status == "ok":
+                        self.summary.succeeded += 1
+                    else:
+                        self.summary.failed += 1
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)))))
+
+        self.summary.wall_seconds = time.perf_counter() - started
+        return self.summary
+
+    async def _run_task(self, task : BatchTask) -> BatchResult:
+        result = BatchResult(task_id=task.task_id, status="ok")
+        try:
+            await asyncio.wait_for(self._run_agent(task, result), self.task_timeout)
+        except asyncio.TimeoutError:
+            result.status, result.error = "error", f"Timed out after {self.task_timeout}s"
+        except Exception as e:
+            result.status, result.error = "error", f"{type(e).__name__} : {e}"
+        return result
+
+    async def _run_agent(self, task : BatchTask, result : BatchResult) -> None:
+        metrics = result.metrics
+        metrics.update(tool_calls=0, tool_errors=0, ttft_seconds=None)
+        started = time.perf_counter()
+        agent = None
+        try:
+            async with Agent(cwd=task.cwd, client=self.client, budget=self.budget) as agent, \
+                       aclosing(agent.run(task.prompt)) as events:
+                async for event in events:
+                    if metrics["ttft_seconds"] is None and event.type in (AgentEventType.TEXT_DELTA,
+                                                                          AgentEventType.TOOL_CALL_START):
+                        metrics["ttft_seconds"] = round(time.perf_counter() - started, 4)
+                    if event.type == AgentEventType.TOOL_CALL_COMPLETE:
+                        metrics["tool_calls"] += 1
+                        if not event.data.get("success"):
+                            metrics["tool_errors"] += 1
+                    elif event.type == AgentEventType.AGENT_ERROR:
+                        result.status, result.error = "error", event.data.get("error")
+                    elif event.type == AgentEventType.BUDGET_EXCEEDED:
+                        result.status, result.error = "budget_exceeded", event.data.get("message")
+                    elif event.type == AgentEventType.AGENT_END:
+                        result.response = event.data.get("message") or None
+        finally:
+            metrics["wall_seconds"] = round(time.perf_counter() - started, 4)
+            # also for tasks that timed out or raised: those are the ones
+            # whose cost matters most
+            if agent is not None:
+                self.summary.ledger.merge(agent.session)
+                metrics["usage"] = asdict(agent.session.usage)
+                metrics["cost_usd"] = round(agent.session.cost, 6)
+
+
+def default_output_path(input_path : Path) -> Path:
+    return input_path.with_name(f"{input_path.stem}.results.jsonl")
@@ -0,0 +1,142 @@
+from __future__ import annotations
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+from client.pricing import PriceTable, get_price_table
+from client.response import TokenUsage
+
+
+def _env_float(name : str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+@dataclass
+class TurnUsage:
+    turn : int
+    model : Optional[str]
+    usage : TokenUsage
+    cost : float
+    # True when the provider sent no usage and it was estimated locally
+    estimated : bool = False
+    # "turn", or "compaction" for context summaries
+    kind : str = "turn"
+
+
+@dataclass
+class UsageLedger:
+    usage : TokenUsage = field(default_factory=TokenUsage)
+    cost : float = 0.0
+    turns : list[TurnUsage] = field(default_factory=list)
+
+    def record(self, turn : TurnUsage) -> None:
+        self.turns.append(turn)
+        self.usage = self.usage + turn.usage
+        self.cost += turn.cost
+
+    def merge(self, other : UsageLedger) -> None:
+        # session and batch totals keep the sums, not every turn
+        self.usage = self.usage + other.usage
+        self.cost += other.cost
+
+    def to_dict(self, include_turns : bool = False) -> dict[str, Any]:
+        data = {"usage": asdict(self.usage), "cost_usd": round(self.cost, 6), "turns": len(self.turns)}
+        if include_turns:
+            data["per_turn"] = [asdict(turn) for turn in self.turns]
+        return data
+
+
+@dataclass
+class Budget:
+    # hard limits for one agent run (one prompt); None means unlimited
+    max_tokens : Optional[int] = None
+    max_cost : Optional[float] = None
+    max_seconds : Optional[float] = None
+    # crossing this fraction of any limit asks the model to wrap up
+    soft_fraction : float = 0.8
+
+    @classmethod
+    def from_env(cls) -> Budget:
+        tokens = _env_float("CODY_BUDGET_TOKENS")
+        return cls(max_tokens=int(tokens) if tokens is not None else None,
+                   max_cost=_env_float("CODY_BUDGET_USD"),
+                   max_seconds=_env_float("CODY_BUDGET_SECONDS"),
+                   soft_fraction=_env_float("CODY_BUDGET_SOFT_FRACTION") or 0.8)
+
+    @property
+    def unlimited(self) -> bool:
+        return self.max_tokens is None and self.max_cost is None and self.max_seconds is None
+
+
+@dataclass
+class BudgetCheck:
+    kind : str
+    used : float
+    limit : float
+    hard : bool
+
+    @property
+    def message(self) -> str:
+        level = "Budget exhausted" if self.hard else "Budget nearly exhausted"
+        return f"{level} : {self.kind} {self.used:g} of {self.limit:g}"
+
+
+class BudgetTracker:
+
+    def __init__(self, budget : Budget, prices : Optional[PriceTable] = None):
+        self.budget = budget
+        self.prices = prices or get_price_table()
+        self.ledger = UsageLedger()
+        self.started = time.monotonic()
+        self.warned = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def remaining(self) -> Optional[float]:
+        # seconds left before the time limit, None without one
+        if self.budget.max_seconds is None:
+            return None
+        return max(0.0, self.budget.max_seconds - self.elapsed)
+
+    def record(self, turn : int, model : Optional[str], usage : TokenUsage, estimated : bool = False,
+               kind : str = "turn") -> TurnUsage:
+        turn_usage = TurnUsage(turn=turn, model=model, usage=usage,
+                               cost=self.prices.cost(model, usage), estimated=estimated, kind=kind)
+        self.ledger.record(turn_usage)
+        return turn_usage
+
+    def _measurements(self) -> list[tuple[str, float, Optional[float]]]:
+        return [("tokens", self.ledger.usage.total_tokens, self.budget.max_tokens),
+                ("cost_usd", round(self.ledger.cost, 6), self.budget.max_cost),
+                ("seconds", round(self.elapsed, 1), self.budget.max_seconds)]
+
+    def exceeded(self) -> Optional[BudgetCheck]:
+        for kind, used, limit in self._measurements():
+            if limit is not None and used >= limit:
+                return BudgetCheck(kind, used, limit, hard=True)
+        return None
+
+    def should_warn(self) -> Optional[BudgetCheck]:
+        # reported once per run
+        if self.warned:
+            return None
+        for kind, used, limit in self._measurements():
+            if limit is not None and used >= limit * self.budget.soft_fraction:
+                self.warned = True
+                return BudgetCheck(kind, used, limit, hard=False)
+        return None
+
+    def deadline_exceeded(self) -> BudgetCheck:
+        return BudgetCheck("seconds", round(self.elapsed, 1), self.budget.max_seconds, hard=True)
+
+    def summary(self, reason : Optional[BudgetCheck] = None) -> dict[str, Any]:
+        data = self.ledger.to_dict(include_turns=True)
+        data["elapsed_seconds"] = round(self.elapsed, 3)
+        if reason is not None:
+            data["stopped"] = asdict(reason) | {"message": reason.message}
+        return data
@@ -0,0 +1,231 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from agent.agent import Agent
+from agent.daemon_client import SOCKET_PATH, STREAM_LIMIT
+from agent.pipeline import EventPipeline
+from client.llm_client import LLMClient
+from context.manager import ContextManager
+from utils.text import get_encoding
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DaemonSession:
+    session_id : str
+    agent : Agent
+    lock : asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used : float = field(default_factory=time.monotonic)
+
+
+class _Connection:
+
+    def __init__(self, writer : asyncio.StreamWriter):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.requests : dict[Any, asyncio.Task] = {}
+
+    async def send(self, message : dict[str, Any]) -> None:
+        line = json.dumps(message, default=str).encode() + b"\n"
+        # requests on one connection are multiplexed; keep lines whole
+        async with self.lock:
+            self.writer.write(line)
+            await self.writer.drain()
+
+
+class DaemonServer:
+    # Serves agent sessions over a Unix socket with line-delimited JSON.
+    #
+    # Requests : {"type": "run", "request_id", "prompt", "session"?, "cwd"?}
+    #            {"type": "cancel", "request_id"} (of the request to cancel)
+    #            {"type": "close_session", "request_id", "session"}
+    #            {"type": "ping", "request_id"}
+    # Responses: {"request_id", "session", "event": AgentEvent.to_dict()} per
+    #            event, then {"request_id", "type": "done"}; failures are
+    #            {"request_id", "type": "error", "error"}.
+
+    SESSION_IDLE_SECONDS = float(os.environ.get("CODY_SESSION_IDLE_SECONDS", 30 * 60))
+
+    def __init__(self, socket_path : Path = SOCKET_PATH, client : Optional[LLMClient] = None):
+        self.socket_path = socket_path
+        self.client = client or LLMClient()
+        self.sessions : dict[str, DaemonSession] = {}
+        self._server : Optional[asyncio.AbstractServer] = None
+        self._reaper : Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._remove_stale_socket()
+        self.socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # the socket is created owner-only; chmod after bind would leave a
+        # window in which anyone could connect
+        umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=str(self.socket_path),
+                                                           limit=STREAM_LIMIT)
+        finally:
+            os.umask(umask)
+        # pay the one-off costs now rather than on the first prompt
+        self.client.warm_up()
+        await asyncio.to_thread(get_encoding, ContextManager.MODEL_NAME)
+        self._reaper = asyncio.create_task(self._reap_idle_sessions())
+        logger.info(f"Daemon listening on {self.socket_path}")
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def _remove_stale_socket(self) -> None:
+        if not self.socket_path.exists():
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(self.socket_path))
+        except OSError:
+            self.socket_path.unlink()
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+    def _peer_allowed(self, writer : asyncio.StreamWriter) -> bool:
+        # only the user running the daemon may drive it (Linux; elsewhere the
+        # socket's permissions are the only check)
+        sock = writer.get_extra_info("socket")
+        if sock is None or not hasattr(socket, "SO_PEERCRED"):
+            return True
+        try:
+            _, uid, _ = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                            struct.calcsize("3i")))
+        except OSError:
+            return False
+        return uid == os.getuid()
+
+    async def _handle_connection(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        if not self._peer_allowed(writer):
+            logger.warning("Rejected a daemon connection from another user")
+            writer.close()
+            return
+        connection = _Connection(writer)
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    await connection.send({"type": "error", "error": "Invalid JSON"})
+                    continue
+                self._dispatch(connection, message)
+        except (ConnectionError, ValueError) as e:
+            logger.debug(f"Daemon connection dropped : {e}")
+        finally:
+            # nobody is left to read the events of running requests
+            for task in connection.requests.values():
+                task.cancel()
+            writer.close()
+
+    def _dispatch(self, connection : _Connection, message : dict[str, Any]) -> None:
+        request_id = message.get("request_id")
+        kind = message.get("type")
+        if kind == "cancel":
+            task = connection.requests.get(request_id)
+            if task is not None:
+                task.cancel()
+            return
+
+        handlers = {"run": self._run, "close_session": self._close_session, "ping": self._ping}
+        handler = handlers.get(kind)
+        if handler is None:
+            handler = self._unknown
+
+        task = asyncio.create_task(self._respond(connection, request_id, handler(connection, message)))
+        connection.requests[request_id] = task
+        task.add_done_callback(lambda _: connection.requests.pop(request_id, None))
+
+    async def _respond(self, connection : _Connection, request_id : Any, handler) -> None:
+        try:
+            await handler
+            await connection.send({"request_id": request_id, "type": "done"})
+        except asyncio.CancelledError:
+            if not connection.writer.is_closing():
+                await connection.send({"request_id": request_id, "type": "error", "error": "Cancelled"})
+            raise
+        except Exception as e:
+            logger.debug("Daemon request failed", exc_info=True)
+            await connection.send({"request_id": request_id, "type": "error", "error": f"{type(e).__name__} : {e}"})
+
+    async def _run(self, connection : _Connection, message : dict[str, Any]) -> None:
+        session = self._get_session(message.get("session"), message.get("cwd"))
+        request_id = message.get("request_id")
+        # a session is one conversation; its prompts run one after another
+        async with session.lock:
+            session.last_used = time.monotonic()
+            # a slow client gets merged text deltas instead of stalling the model
+            async with EventPipeline(session.agent.run(message["prompt"])) as pipeline:
+                events = pipeline.subscribe()
+                pipeline.start()
+                async for event in events:
+                    await connection.send({"request_id": request_id,
+                                           "session": session.session_id,
+                                           "event": event.to_dict()})
+            session.last_used = time.monotonic()
+
+    async def _close_session(self, connection : _Connection, message : dict[str, Any]) -> None:
+        session = self.sessions.pop(message.get("session"), None)
+        if session is None:
+            raise ValueError(f"Unknown session {message.get('session')}")
+        async with session.lock:
+            await session.agent.__aexit__(None, None, None)
+
+    async def _ping(self, connection : _Connection, message : dict[str, Any]) -> None:
+        await connection.send({"request_id": message.get("request_id"), "type": "pong",
+                               "sessions": len(self.sessions)})
+
+    async def _unknown(self, connection : _Connection, message : dict[str, Any]) -> None:
+        raise ValueError(f"Unknown request type {message.get('type')!r}")
+
+    def _get_session(self, session_id : Optional[str], cwd : Optional[str]) -> DaemonSession:
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise ValueError(f"Unknown session {session_id}")
+            return session
+
+        session_id = uuid.uuid4().hex[:12]
+        # every session shares the warm client, connection pool and caches
+        agent = Agent(cwd=Path(cwd) if cwd else None, client=self.client)
+        session = self.sessions[session_id] = DaemonSession(session_id, agent)
+        return session
+
+    async def _reap_idle_sessions(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.SESSION_IDLE_SECONDS / 10))
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if not session.lock.locked() and now - session.last_used > self.SESSION_IDLE_SECONDS:
+                    del self.sessions[session_id]
+                    await session.agent.__aexit__(None, None, None)
+
+    async def close(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._server is not None:
+            self._server.close()
+        for session in list(self.sessions.values()):
+            await session.agent.__aexit__(None, None, None)
+        self.sessions.clear()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
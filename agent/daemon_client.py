@@ -0,0 +1,133 @@
+from __future__ import annotations
+# Thin client for the daemon in agent/daemon.py. It only imports the standard
+# library (and click) so that forwarding a prompt starts instantly; all the
+# heavy state lives in the daemon.
+import asyncio
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+import click
+
+SOCKET_PATH = Path(os.environ.get("CODY_SOCKET",
+                                  Path(os.environ.get("CODY_CACHE_DIR", Path.home() / ".cache" / "cody")) / "daemon.sock"))
+# an event line holds a whole tool result, so allow more than asyncio's 64KB
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class DaemonClient:
+
+    def __init__(self, socket_path : Path = SOCKET_PATH):
+        self.socket_path = socket_path
+        self._reader : Optional[asyncio.StreamReader] = None
+        self._writer : Optional[asyncio.StreamWriter] = None
+        self._request_ids = itertools.count(1)
+        self._queues : dict[int, asyncio.Queue] = {}
+        self._read_task : Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_unix_connection(str(self.socket_path), limit=STREAM_LIMIT)
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        try:
+            async for line in self._reader:
+                message = json.loads(line)
+                queue = self._queues.get(message.get("request_id"))
+                if queue is not None:
+                    queue.put_nowait(message)
+        finally:
+            # wake up everyone still waiting on a closed connection
+            for queue in self._queues.values():
+                queue.put_nowait({"type": "error", "error": "Connection to daemon closed"})
+
+    async def _send(self, message : dict[str, Any]) -> None:
+        self._writer.write(json.dumps(message).encode() + b"\n")
+        await self._writer.drain()
+
+    async def request(self, message : dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        # yields every response line for this request until its "done" line
+        request_id = next(self._request_ids)
+        queue = self._queues[request_id] = asyncio.Queue()
+        try:
+            await self._send({**message, "request_id": request_id})
+            while True:
+                response = await queue.get()
+                if response.get("type") in ("done", "error"):
+                    if response.get("type") == "error":
+                        yield response
+                    return
+                yield response
+        finally:
+            del self._queues[request_id]
+
+    async def run(self, prompt : str, session : Optional[str] = None,
+                  cwd : Optional[str] = None) -> AsyncIterator[dict[str, Any]]:
+        async for response in self.request({"type": "run", "prompt": prompt, "session": session,
+                                            "cwd": cwd or os.getcwd()}):
+            yield response
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        if self._read_task is not None:
+            self._read_task.cancel()
+
+
+async def forward_prompt(prompt : str, session : Optional[str], socket_path : Path) -> int:
+    client = DaemonClient(socket_path)
+    await client.connect()
+    exit_code, streaming = 0, False
+    try:
+        async for response in client.run(prompt, session=session):
+            if response.get("type") == "error":
+                print(f"\nError : {response.get('error')}", file=sys.stderr)
+                return 1
+            event = response.get("event") or {}
+            data = event.get("data") or {}
+            kind = event.get("type")
+            if kind == "text_delta":
+                sys.stdout.write(data.get("content", ""))
+                sys.stdout.flush()
+                streaming = True
+                continue
+            if streaming:
+                sys.stdout.write("\n")
+                streaming = False
+            if kind == "agent_start" and response.get("session") and not session:
+                print(f"session {response['session']}", file=sys.stderr)
+            elif kind == "tool_call_start":
+                print(f"-> {data.get('name')} {json.dumps(data.get('arguments', {}))}", file=sys.stderr)
+            elif kind == "tool_call_complete" and not data.get("success"):
+                print(f"<- {data.get('name')} failed : {data.get('error')}", file=sys.stderr)
+            elif kind == "agent_error":
+                print(f"Error : {data.get('error')}", file=sys.stderr)
+                exit_code = 1
+            elif kind in ("budget_warning", "budget_exceeded"):
+                print(data.get("message"), file=sys.stderr)
+                if kind == "budget_exceeded":
+                    exit_code = 1
+    finally:
+        await client.close()
+    return exit_code
+
+
+@click.command()
+@click.argument("prompt")
+@click.option("--session", default=None, help="Continue an existing daemon session.")
+@click.option("--socket", "socket_path", type=click.Path(path_type=Path), default=SOCKET_PATH,
+              show_default=True, help="Daemon socket.")
+def main(prompt : str, session : Optional[str], socket_path : Path):
+    try:
+        sys.exit(asyncio.run(forward_prompt(prompt, session, socket_path)))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No daemon listening on {socket_path}; start one with `python main.py --serve`.", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from enum import Enum
-from dataclasses import dataclass, field
 from typing import Any, Optional
-from client.response import TokenUsage
+from client.response import TokenUsage, ToolCall
+from tools.base import ToolResults
 
 
 class AgentEventType(str, Enum):
@@ -14,12 +14,43 @@ class AgentEventType(str, Enum):
     TEXT_DELTA = "text_delta"
     TEXT_COMPLETE = "text_complete"
 
+    TOOL_CALL_START = "tool_call_start"
+    TOOL_CALL_COMPLETE = "tool_call_complete"
+
+    BUDGET_WARNING = "budget_warning"
+    BUDGET_EXCEEDED = "budget_exceeded"
+
 
-@dataclass
 class AgentEvent:
+    # One is created per streamed token, so text events keep their text in
+    # `content` and only build the `data` dict if someone asks for it.
+    __slots__ = ("type", "content", "_data")
+
+    def __init__(self, type : AgentEventType, data : Optional[dict[str, Any]] = None,
+                 content : Optional[str] = None):
+        self.type = type
+        self.content = content
+        self._data = data
+
+    @property
+    def data(self) -> dict[str, Any]:
+        if self._data is None:
+            self._data = {"content": self.content} if self.content is not None else {}
+        return self._data
+
+    def __repr__(self) -> str:
+        return f"AgentEvent(type={self.type.value}, data={self.data!r})"
+
+    def __eq__(self, other : object) -> bool:
+        if not isinstance(other, AgentEvent):
+            return NotImplemented
+        return self.type == other.type and self.data == other.data
+
+    def can_merge(self, other : AgentEvent) -> bool:
+        return self.type == other.type == AgentEventType.TEXT_DELTA
 
-    type : AgentEventType
-    data : dict[str, Any] = field(default_factory=dict)
+    def merge(self, other : AgentEvent) -> AgentEvent:
+        return AgentEvent(AgentEventType.TEXT_DELTA, content=(self.content or "") + (other.content or ""))
 
     @classmethod
     def agent_start(cls, message : str )-> AgentEvent:
@@ -29,10 +60,25 @@ class AgentEvent:
         )
     
     @classmethod
-    def agent_end(cls, message : Optional[str], usage : Optional[TokenUsage] = None )-> AgentEvent:
+    def agent_end(cls, message : Optional[str], usage : Optional[TokenUsage] = None,
+                  summary : Optional[dict[str, Any]] = None )-> AgentEvent:
         return cls(
             type= AgentEventType.AGENT_END,
-            data = {"message":message, "usage": usage.__dict__ if usage else None},
+            data = {"message":message, "usage": usage.__dict__ if usage else None, "summary": summary},
+        )
+
+    @classmethod
+    def budget_warning(cls, message : str, summary : dict[str, Any] )-> AgentEvent:
+        return cls(
+            type= AgentEventType.BUDGET_WARNING,
+            data = {"message":message, "summary":summary},
+        )
+
+    @classmethod
+    def budget_exceeded(cls, message : str, summary : dict[str, Any] )-> AgentEvent:
+        return cls(
+            type= AgentEventType.BUDGET_EXCEEDED,
+            data = {"message":message, "summary":summary},
         )
 
     @classmethod
@@ -46,11 +92,42 @@ class AgentEvent:
     def text_delta(cls, content : str )-> AgentEvent:
         return cls(
             type= AgentEventType.TEXT_DELTA,
-            data = {"content":content},
+            content = content,
         )
     @classmethod
     def text_complete(cls, content : str )-> AgentEvent:
         return cls(
             type= AgentEventType.TEXT_COMPLETE,
-            data = {"content":content},
-        )
\ No newline at end of file
+            content = content,
+        )
+
+    @classmethod
+    def tool_call_start(cls, call : ToolCall )-> AgentEvent:
+        return cls(
+            type= AgentEventType.TOOL_CALL_START,
+            data = {"call_id":call.call_id, "name":call.name, "arguments":call.arguments},
+        )
+
+    @classmethod
+    def tool_call_complete(cls, call : ToolCall, result : ToolResults )-> AgentEvent:
+        return cls(
+            type= AgentEventType.TOOL_CALL_COMPLETE,
+            data = {"call_id":call.call_id,
+                    "name":call.name,
+                    "success":result.success,
+                    "output":result.output,
+                    "error":result.error,
+                    "metadata":result.metadata,
+                    "truncated":result.truncated},
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"type": self.type.value, "data": self.data}
+
+    @classmethod
+    def from_dict(cls, data : dict[str, Any]) -> AgentEvent:
+        event_type = AgentEventType(data["type"])
+        payload = data.get("data") or {}
+        if event_type in (AgentEventType.TEXT_DELTA, AgentEventType.TEXT_COMPLETE):
+            return cls(type=event_type, content=payload.get("content", ""))
+        return cls(type=event_type, data=payload)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import asyncio
+import json
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from agent.event import AgentEvent
+
+
+class EventSubscription:
+    # Bounded per-subscriber buffer. When it is full, a text delta is merged
+    # into the text delta before it instead of waiting for the consumer, so
+    # the producer never blocks. Other events are never merged or dropped;
+    # they may overflow the bound, but there are only a few per turn.
+
+    def __init__(self, maxsize : int):
+        self.maxsize = max(1, maxsize)
+        self._events : deque[AgentEvent] = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.merged = 0
+
+    def put(self, event : AgentEvent) -> None:
+        self.received += 1
+        if len(self._events) >= self.maxsize and self._events and self._events[-1].can_merge(event):
+            self._events[-1] = self._events[-1].merge(event)
+            self.merged += 1
+        else:
+            self._events.append(event)
+        self._ready.set()
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[AgentEvent]:
+        # None once the stream has ended and everything was consumed
+        while not self._events:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._events.popleft()
+
+    def __aiter__(self) -> AsyncIterator[AgentEvent]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[AgentEvent]:
+        while (event := await self.get()) is not None:
+            yield event
+
+
+class EventPipeline:
+    # Runs an event source (Agent.run) in its own task and fans the events out
+    # to every subscriber, so a slow consumer never holds up reading the
+    # model's stream.
+
+    DEFAULT_MAXSIZE = 256
+
+    def __init__(self, source : AsyncIterator[AgentEvent], maxsize : int = DEFAULT_MAXSIZE):
+        self.source = source
+        self.maxsize = maxsize
+        self.subscriptions : list[EventSubscription] = []
+        self.error : Optional[BaseException] = None
+        self._task : Optional[asyncio.Task] = None
+
+    def subscribe(self, maxsize : Optional[int] = None) -> EventSubscription:
+        if self._task is not None:
+            raise RuntimeError("Subscribe before the pipeline starts")
+        subscription = EventSubscription(maxsize or self.maxsize)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self._pump())
+        return self._task
+
+    async def _pump(self) -> None:
+        try:
+            async for event in self.source:
+                for subscription in self.subscriptions:
+                    subscription.put(event)
+        except Exception as e:
+            self.error = e
+            for subscription in self.subscriptions:
+                subscription.put(AgentEvent.agent_error(f"{type(e).__name__} : {e}"))
+        finally:
+            for subscription in self.subscriptions:
+                subscription.close()
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self) -> EventPipeline:
+        # subscribe, then start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+
+async def write_event_log(subscription : EventSubscription, path : Path) -> None:
+    # one JSON object per event; text deltas arrive already merged when the
+    # disk falls behind
+    with open(path, "a", encoding="utf-8") as log:
+        async for event in subscription:
+            log.write(json.dumps(event.to_dict(), default=str) + "\n")
+        log.flush()
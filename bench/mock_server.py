@@ -0,0 +1,223 @@
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import click
+
+
+@dataclass
+class MockScript:
+    # what the stand-in model does on every request
+    text_tokens : int = 50
+    token : str = "lorem "
+    # issued when tools are offered and the last message is from the user;
+    # the follow-up request (after the tool results) gets a text answer
+    tool_calls : list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+    ttft : float = 0.0
+    delay : float = 0.0
+    argument_fragment_chars : int = 8
+    model : str = "mock-model"
+
+
+class MockServer:
+    
+    def __init__(self, script : Optional[MockScript] = None, host : str = "127.0.0.1", port : int = 0):
+        self.script = script or MockScript()
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.connections = 0
+        self._server : Optional[asyncio.base_events.Server] = None
+        
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+        
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+    
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            
+    async def _handle(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                
+                self.requests += 1
+                if method == "POST" and path.endswith("/chat/completions"):
+                    await self._chat_completion(writer, json.loads(body or b"{}"))
+                elif method == "GET" and path.endswith("/models"):
+                    await self._json(writer, {"object": "list", "data": [{"id": self.script.model, "object": "model"}]})
+                else:
+                    await self._json(writer, {"error": {"message": f"Not found : {path}"}}, status="404 Not Found")
+                    
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            
+    async def _json(self, writer : asyncio.StreamWriter, payload : dict[str, Any], status : str = "200 OK") -> None:
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+        
+    def _chunks(self, body : dict[str, Any]) -> tuple[list[dict[str, Any]], str, str]:
+        messages = body.get("messages") or []
+        script = self.script
+        deltas, text = [], ""
+        if script.tool_calls and body.get("tools") and messages and messages[-1].get("role") == "user":
+            finish_reason = "tool_calls"
+            for index, (name, arguments) in enumerate(script.tool_calls):
+                raw = json.dumps(arguments)
+                size = max(1, script.argument_fragment_chars)
+                fragments = [raw[i:i + size] for i in range(0, len(raw), size)] or [""]
+                for n, fragment in enumerate(fragments):
+                    call = {"index": index, "function": {"arguments": fragment}}
+                    if n == 0:
+                        call.update({"id": f"call_{self.requests}_{index}", "type": "function"})
+                        call["function"]["name"] = name
+                    deltas.append({"tool_calls": [call]})
+        else:
+            finish_reason = "stop"
+            for _ in range(script.text_tokens):
+                deltas.append({"content": script.token})
+            text = script.token * script.text_tokens
+        return deltas, finish_reason, text
+    
+    def _usage(self, body : dict[str, Any], completion_tokens : int) -> dict[str, Any]:
+        prompt_tokens = len(json.dumps(body.get("messages") or [])) // 4
+        return {"prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}}
+            
+    async def _chat_completion(self, writer : asyncio.StreamWriter, body : dict[str, Any]) -> None:
+        script = self.script
+        deltas, finish_reason, text = self._chunks(body)
+        created = int(time.time())
+        
+        if not body.get("stream"):
+            await asyncio.sleep(script.ttft + script.delay * len(deltas))
+            message : dict[str, Any] = {"role": "assistant", "content": text or None}
+            calls = [delta["tool_calls"][0] for delta in deltas if "tool_calls" in delta]
+            if calls:
+                merged : dict[int, dict[str, Any]] = {}
+                for call in calls:
+                    entry = merged.setdefault(call["index"], {"id": call.get("id"), "type": "function",
+                                                              "function": {"name": call["function"].get("name"), "arguments": ""}})
+                    entry["function"]["arguments"] += call["function"]["arguments"]
+                message["tool_calls"] = list(merged.values())
+            await self._json(writer, {"id": "chatcmpl-mock", "object": "chat.completion", "created": created,
+                                      "model": script.model,
+                                      "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                                      "usage": self._usage(body, len(deltas))})
+            return
+        
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+        
+        async def send(payload : str) -> None:
+            data = f"data: {payload}\n\n".encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            
+        def chunk(delta : dict[str, Any], finish : Optional[str] = None) -> str:
+            return json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                               "model": script.model,
+                               "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]})
+        
+        if script.ttft:
+            await asyncio.sleep(script.ttft)
+        await send(chunk({"role": "assistant", "content": ""}))
+        for delta in deltas:
+            await send(chunk(delta))
+            if script.delay:
+                await asyncio.sleep(script.delay)
+        await send(chunk({}, finish_reason))
+        if body.get("stream_options", {}).get("include_usage", True):
+            await send(json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                                   "model": script.model, "choices": [],
+                                   "usage": self._usage(body, len(deltas))}))
+        await send("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+class ThreadedMockServer:
+    
+    # runs the server on its own event loop so it does not compete with the
+    # client loop being measured
+    def __init__(self, script : Optional[MockScript] = None):
+        self.server = MockServer(script)
+        self._loop : Optional[asyncio.AbstractEventLoop] = None
+        self._thread : Optional[threading.Thread] = None
+        
+    def __enter__(self) -> MockServer:
+        ready = threading.Event()
+        
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.server.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.server.stop())
+            self._loop.close()
+            
+        self._thread = threading.Thread(target=run, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.server
+    
+    def __exit__(self, *exc_info) -> None:
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join()
+
+
+@click.command()
+@click.option("--port", default=8765, show_default=True)
+@click.option("--tokens", default=50, show_default=True, help="Text deltas per answer.")
+@click.option("--delay", default=0.01, show_default=True, help="Seconds between deltas.")
+@click.option("--ttft", default=0.2, show_default=True, help="Seconds before the first delta.")
+@click.option("--tool-call", "tool_calls", multiple=True, help="Tool call to issue first, as name:json_arguments.")
+def main(port : int, tokens : int, delay : float, ttft : float, tool_calls : tuple[str, ...]):
+    script = MockScript(text_tokens=tokens, delay=delay, ttft=ttft,
+                        tool_calls=[(name, json.loads(arguments or "{}"))
+                                    for name, _, arguments in (call.partition(":") for call in tool_calls)])
+    server = MockServer(script, port=port)
+    
+    async def serve():
+        print(f"Mock OpenAI-compatible server on {await server.start()}")
+        await asyncio.Event().wait()
+        
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import asyncio
+import gc
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Optional
+
+import click
+
+# benchmarks must never hit a real endpoint or the replay cache
+os.environ.setdefault("OPENROUTER_API", "mock-key")
+os.environ["CODY_LLM_CACHE"] = "off"
+
+from rich.console import Console
+
+from agent.agent import Agent
+from agent.event import AgentEventType
+from bench.mock_server import MockScript, ThreadedMockServer
+from client.llm_client import LLMClient
+from client.pool import close_client_pool
+from main import CLI
+from ui.tui import AGENT_THEME, TUI
+
+
+def _summary(samples : list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {"mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+            "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] * 1000, 3),
+            "min_ms": round(ordered[0] * 1000, 3)}
+
+
+async def bench_ttft(base_url : str, iterations : int) -> dict[str, Any]:
+    # prompt submitted -> first text delta out of Agent.run
+    samples = []
+    for _ in range(iterations):
+        async with Agent(client=LLMClient(base_url=base_url)) as agent:
+            started = time.perf_counter()
+            first : Optional[float] = None
+            async for event in agent.run("hello"):
+                if first is None and event.type == AgentEventType.TEXT_DELTA:
+                    first = time.perf_counter() - started
+            samples.append(first if first is not None else time.perf_counter() - started)
+    return _summary(samples)
+
+
+async def bench_events(base_url : str, iterations : int) -> dict[str, Any]:
+    # how fast CLI._process_message drains events into the TUI
+    rates = []
+    for _ in range(iterations):
+        cli = CLI()
+        cli.tui = TUI(Console(file=io.StringIO(), theme=AGENT_THEME, force_terminal=True, width=120))
+        async with Agent(client=LLMClient(base_url=base_url)) as agent:
+            cli.agent = agent
+            events = 0
+            run = agent.run
+            
+            async def counted(message : str):
+                nonlocal events
+                async for event in run(message):
+                    events += 1
+                    yield event
+                    
+            agent.run = counted
+            started = time.perf_counter()
+            await cli._process_message("hello")
+            rates.append(events / (time.perf_counter() - started))
+    return {"events_per_sec": round(statistics.fmean(rates), 1), "events_per_run": events}
+
+
+async def _raw_stream(base_url : str, messages : list[dict[str, Any]], tools : Optional[list[dict[str, Any]]]) -> None:
+    client = LLMClient(base_url=base_url)
+    try:
+        async for _ in client.chat_completion(messages, tools=tools):
+            pass
+    finally:
+        await client.close()
+
+
+async def bench_turn_overhead(base_url : str, iterations : int, workspace : Path) -> dict[str, Any]:
+    # a tool turn (model -> read_file -> model) through Agent.run, minus the
+    # same two completions streamed straight through LLMClient
+    agent_samples, raw_samples = [], []
+    for _ in range(iterations):
+        async with Agent(cwd=workspace, client=LLMClient(base_url=base_url)) as agent:
+            started = time.perf_counter()
+            async for _ in agent.run("read the file"):
+                pass
+            agent_samples.append(time.perf_counter() - started)
+            
+            tools = agent.tool_registry.get_schemas()
+            messages = agent.context_manager.get_messages()
+            started = time.perf_counter()
+            await _raw_stream(base_url, messages[:2], tools)
+            await _raw_stream(base_url, messages, tools)
+            raw_samples.append(time.perf_counter() - started)
+            
+    overhead = [(agent - raw) / 2 for agent, raw in zip(agent_samples, raw_samples)]
+    return {"agent_run": _summary(agent_samples),
+            "raw_completions": _summary(raw_samples),
+            "overhead_per_model_call": _summary(overhead)}
+
+
+async def bench_memory(base_url : str, sessions : int) -> dict[str, Any]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    agents = []
+    for _ in range(sessions):
+        agent = Agent(client=LLMClient(base_url=base_url))
+        async for _ in agent.run("hello"):
+            pass
+        agents.append(agent)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    for agent in agents:
+        await agent.__aexit__(None, None, None)
+    return {"sessions": sessions, "bytes_per_session": allocated // sessions}
+
+
+async def run_suite(iterations : int, tokens : int, sessions : int) -> dict[str, Any]:
+    results : dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as workspace:
+        (Path(workspace) / "module.py").write_text("def answer():\n    return 42\n" * 50)
+        
+        with ThreadedMockServer(MockScript(text_tokens=tokens)) as server:
+            results["ttft"] = await bench_ttft(server.base_url, iterations)
+            results["events"] = await bench_events(server.base_url, iterations)
+            results["memory"] = await bench_memory(server.base_url, sessions)
+            
+        with ThreadedMockServer(MockScript(text_tokens=tokens, tool_calls=[("read_file", {"path": "module.py"})])) as server:
+            results["turn_overhead"] = await bench_turn_overhead(server.base_url, iterations, Path(workspace))
+    await close_client_pool()
+    return results
+
+
+@click.command()
+@click.option("--iterations", default=20, show_default=True)
+@click.option("--tokens", default=500, show_default=True, help="Text deltas per mock answer.")
+@click.option("--sessions", default=20, show_default=True, help="Agents kept alive for the memory benchmark.")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Also write the results as JSON here.")
+def main(iterations : int, tokens : int, sessions : int, output : Optional[str]):
+    results = asyncio.run(run_suite(iterations, tokens, sessions))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        Path(output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
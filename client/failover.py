@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable, Optional
+
+from client.response import StreamEvent, StreamEventType
+from utils.tracing import NOOP_SPAN, Span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "nvidia/nemotron-nano-12b-v2-vl:free"
+DEFAULT_HEDGE_AFTER_SECONDS = 4.0
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    model : str
+    base_url : str
+
+    @classmethod
+    def parse(cls, spec : str, default_base_url : str) -> "Endpoint":
+        # "model" or "model@https://host/v1"
+        model, sep, base_url = spec.strip().partition("@http")
+        if sep:
+            return cls(model=model, base_url="http" + base_url)
+        return cls(model=model, base_url=default_base_url)
+
+
+def endpoints_from_env(default_base_url : str) -> list[Endpoint]:
+    specs = [spec for spec in os.environ.get("CODY_MODELS", DEFAULT_MODEL).split(",") if spec.strip()]
+    return [Endpoint.parse(spec, default_base_url) for spec in specs or [DEFAULT_MODEL]]
+
+
+def hedge_after_from_env() -> Optional[float]:
+    # 0 turns hedging off; failover on errors still applies
+    seconds = float(os.environ.get("CODY_HEDGE_TTFT_SECONDS", DEFAULT_HEDGE_AFTER_SECONDS))
+    return seconds if seconds > 0 else None
+
+
+@dataclass
+class FailoverStats:
+    requests : int = 0
+    hedges : int = 0
+    failovers : int = 0
+    wins : dict[str, int] = field(default_factory=dict)
+
+
+class _Attempt:
+
+    def __init__(self, endpoint : Endpoint, events : AsyncGenerator[StreamEvent, None],
+                 queue : asyncio.Queue):
+        self.endpoint = endpoint
+        self.task = asyncio.create_task(self._pump(events, queue))
+
+    async def _pump(self, events : AsyncGenerator[StreamEvent, None], queue : asyncio.Queue) -> None:
+        try:
+            async for event in events:
+                await queue.put((self, event))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put((self, StreamEvent.stream_error(error=f"{type(e).__name__} : {e}")))
+        finally:
+            await events.aclose()
+        # None marks the end of this attempt's stream
+        await queue.put((self, None))
+
+    def cancel(self) -> None:
+        self.task.cancel()
+
+
+async def hedged_stream(endpoints : list[Endpoint],
+                        start : Callable[[Endpoint], AsyncGenerator[StreamEvent, None]],
+                        hedge_after : Optional[float],
+                        stats : Optional[FailoverStats] = None,
+                        span : Span = NOOP_SPAN) -> AsyncGenerator[StreamEvent, None]:
+    # Endpoints are tried in order. An attempt that ends in an error before its
+    # first event fails over to the next endpoint; an attempt that has not
+    # produced a first event after `hedge_after` seconds gets raced against the
+    # next endpoint. The first attempt to produce an event wins and the rest
+    # are cancelled. Once an attempt has streamed, its errors are final.
+    stats = stats or FailoverStats()
+    stats.requests += 1
+    queue : asyncio.Queue = asyncio.Queue()
+    remaining = list(endpoints)
+    racing : list[_Attempt] = []
+    last_error : Optional[StreamEvent] = None
+
+    def launch() -> None:
+        endpoint = remaining.pop(0)
+        racing.append(_Attempt(endpoint, start(endpoint), queue))
+
+    launch()
+    winner : Optional[_Attempt] = None
+    try:
+        while winner is None:
+            timeout = hedge_after if remaining else None
+            try:
+                attempt, event = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                logger.debug(f"No first token after {hedge_after}s, hedging to {remaining[0].model}")
+                stats.hedges += 1
+                span.event("hedge", model=remaining[0].model, after_s=hedge_after)
+                launch()
+                continue
+
+            if attempt not in racing:
+                continue
+            if event is None or event.type == StreamEventType.ERROR:
+                racing.remove(attempt)
+                if event is not None:
+                    last_error = event
+                    attempt.cancel()
+                if racing:
+                    continue
+                if not remaining:
+                    yield last_error or StreamEvent.stream_error(error="All endpoints failed")
+                    return
+                logger.debug(f"{attempt.endpoint.model} failed, failing over to {remaining[0].model}")
+                stats.failovers += 1
+                span.event("failover", failed=attempt.endpoint.model, model=remaining[0].model,
+                           error=last_error.error if last_error else "stream ended")
+                launch()
+                continue
+
+            winner = attempt
+            for other in racing:
+                if other is not winner:
+                    other.cancel()
+            racing = [winner]
+            stats.wins[winner.endpoint.model] = stats.wins.get(winner.endpoint.model, 0) + 1
+            span.set(**{"gen_ai.response.model": winner.endpoint.model,
+                        "llm.endpoint": winner.endpoint.base_url})
+            yield event
+
+        while True:
+            attempt, event = await queue.get()
+            if attempt is not winner:
+                continue
+            if event is None:
+                return
+            yield event
+    finally:
+        for attempt in racing:
+            attempt.cancel()
@@ -1,33 +1,65 @@
-from json import tool
+from __future__ import annotations
+import json
 import os
-from typing import Any, Optional,List
-from openai import AsyncOpenAI, RateLimitError, APIConnectionError, APIError
+from typing import TYPE_CHECKING, Any, Optional,List
 from dotenv import load_dotenv
+from client.failover import Endpoint, FailoverStats, endpoints_from_env, hedge_after_from_env, hedged_stream
+from client.pool import get_client_pool
+from client.rate_limit import backoff_delay, get_rate_limiter, retry_after
+from client.replay import ReplayCache, ReplayMode
 from client.response import TextDelta,TokenUsage,StreamEvent,StreamEventType
+from client.tool_call_assembler import ToolCallAssembler, parse_tool_call
+from utils.text import count_tokens
+from utils.tracing import NOOP_SPAN, Span, get_tracer
 from typing import AsyncGenerator
 import asyncio
+import time
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 load_dotenv()
 
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+def _token_usage(usage : Any) -> TokenUsage:
+    # providers may omit prompt_tokens_details (or any field) entirely
+    details = getattr(usage, "prompt_tokens_details", None)
+    return TokenUsage(
+        prompt_tokens=usage.prompt_tokens or 0,
+        completion_tokens= usage.completion_tokens or 0,
+        total_tokens= usage.total_tokens or 0,
+        cached_tokens= (getattr(details, "cached_tokens", None) or 0),
+    )
+
 class LLMClient:
 
-    def __init__(self):    
-        self._client : Optional[AsyncOpenAI] = None
+    def __init__(self, base_url : Optional[str] = None, replay_cache : Optional[ReplayCache] = None,
+                 endpoints : Optional[list[Endpoint]] = None, hedge_after : Optional[float] = None):    
         self._max_retries : int = 3 
+        self.base_url = base_url or os.environ.get("OPENROUTER_BASE_URL", DEFAULT_BASE_URL)
+        self.replay_cache = replay_cache or ReplayCache.from_env()
+        # ordered by preference; later endpoints are hedges and failovers
+        self.endpoints = endpoints or endpoints_from_env(self.base_url)
+        self.hedge_after = hedge_after if hedge_after is not None else hedge_after_from_env()
+        self.failover_stats = FailoverStats()
 
-    def get_client(self) -> AsyncOpenAI:
-
-        if self._client is None:
-            self._client  = AsyncOpenAI(
-                api_key=os.environ["OPENROUTER_API"],
-                base_url= "https://openrouter.ai/api/v1"
-            )
+    @property
+    def model(self) -> str:
+        return self.endpoints[0].model
 
-        return self._client
+    def get_client(self, base_url : Optional[str] = None) -> AsyncOpenAI:
+        # the pool keeps one client per endpoint
+        return get_client_pool().get(base_url or self.base_url, os.environ["OPENROUTER_API"])
+    
+    def warm_up(self) -> None:
+        if self.replay_cache is None or self.replay_cache.mode != ReplayMode.REPLAY:
+            for base_url in dict.fromkeys(endpoint.base_url for endpoint in self.endpoints):
+                get_client_pool().warm_up(base_url, os.environ["OPENROUTER_API"])
     
     async def close(self) -> None:
-        if self._client:
-            await self._client.close()
-            self._client = None
+        # the connection pool is shared; close_client_pool() shuts it down
+        pass
             
             
     def _build_tools(self, tools: list[dict[str, Any]]):
@@ -52,31 +84,103 @@ class LLMClient:
 
     async def chat_completion(self, messages : List[dict[str,Any]], 
                               tools : list[dict[str, Any]] | None = None,
-                              stream : bool = True) -> AsyncGenerator[Optional[StreamEvent], None]:
+                              stream : bool = True,
+                              estimated_tokens : int | None = None,
+                              parent_span : Optional[Span] = None) -> AsyncGenerator[Optional[StreamEvent], None]:
 
-        client = self.get_client()
-        kwargs  ={"model":"nvidia/nemotron-nano-12b-v2-vl:free",
+        kwargs  ={"model":self.model,
                 "messages":messages,
                 "stream" : stream}
         
-        print(messages)
         if tools:
             kwargs['tools'] = self._build_tools(tools)
             kwargs['tool_choice'] = "auto"
+        if stream:
+            # otherwise most providers never report usage for streamed answers
+            kwargs['stream_options'] = {"include_usage": True}
+            
+        span = get_tracer().start_span("llm.request", parent=parent_span, kind="CLIENT",
+                                       **{"gen_ai.operation.name": "chat",
+                                          "gen_ai.request.model": self.model,
+                                          "llm.stream": stream,
+                                          "llm.messages": len(messages),
+                                          "llm.estimated_input_tokens": estimated_tokens})
+        if self.replay_cache:
+            events = self.replay_cache.wrap(kwargs, lambda: self._hedged(kwargs, stream, estimated_tokens, span))
+        else:
+            events = self._hedged(kwargs, stream, estimated_tokens, span)
+            
+        started = time.perf_counter()
+        first_at : Optional[float] = None
+        try:
+            async for event in events:
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    span.set(**{"llm.ttft_ms": (first_at - started) * 1000})
+                if event.finish_reason:
+                    span.set(**{"gen_ai.response.finish_reasons": [event.finish_reason]})
+                if event.usage:
+                    span.set(**{"gen_ai.usage.input_tokens": event.usage.prompt_tokens,
+                                "gen_ai.usage.output_tokens": event.usage.completion_tokens,
+                                "llm.cached_tokens": event.usage.cached_tokens})
+                if event.type == StreamEventType.ERROR:
+                    span.set_error(event.error or "Unknown error")
+                yield event
+        finally:
+            output_tokens = span.attributes.get("gen_ai.usage.output_tokens") if span.recording else None
+            if first_at is not None and output_tokens:
+                generation_seconds = time.perf_counter() - first_at
+                if generation_seconds > 0:
+                    span.set(**{"llm.tokens_per_second": output_tokens / generation_seconds})
+            span.end()
+
+    def _hedged(self, kwargs : dict[str, Any], stream : bool,
+                estimated_tokens : int | None = None,
+                span : Span = NOOP_SPAN) -> AsyncGenerator[Optional[StreamEvent], None]:
+        if len(self.endpoints) == 1:
+            return self._complete(kwargs, stream, estimated_tokens, span=span)
         
+        def start(endpoint : Endpoint):
+            return self._complete({**kwargs, "model": endpoint.model}, stream, estimated_tokens, endpoint.base_url, span)
+        
+        return hedged_stream(self.endpoints, start, self.hedge_after, self.failover_stats, span)
+                
+    async def _complete(self, kwargs : dict[str, Any], stream : bool,
+                        estimated_tokens : int | None = None,
+                        base_url : Optional[str] = None,
+                        span : Span = NOOP_SPAN) -> AsyncGenerator[Optional[StreamEvent], None]:
+        
+        from openai import APIConnectionError, APIError, RateLimitError
+        base_url = base_url or self.base_url
+        client = self.get_client(base_url)
+        limiter = get_rate_limiter(base_url)
+        if limiter and estimated_tokens is None:
+            estimated_tokens = count_tokens(json.dumps(kwargs["messages"]))
+            
         for attempt in range(self._max_retries+1):
             try:
+                if limiter:
+                    # time spent waiting on the client-side rate limiter
+                    span.add("llm.queue_ms", await limiter.acquire(estimated_tokens) * 1000)
                 if stream:
                     async for event in self._stream_response(client, kwargs):
+                        if limiter and event.usage:
+                            limiter.settle(estimated_tokens, event.usage.total_tokens)
                         yield event
                 else:
                     event = await self._non_stream_response(client, kwargs)
+                    if limiter and event.usage:
+                        limiter.settle(estimated_tokens, event.usage.total_tokens)
                     yield event
                 return
 
             except RateLimitError as e:
                 if attempt < self._max_retries:
-                    wait_time = 2**attempt
+                    wait_time = backoff_delay(attempt, e)
+                    span.event("retry", reason="rate_limit", attempt=attempt, delay_s=wait_time)
+                    if limiter and retry_after(e) is not None:
+                        # everyone sharing the endpoint holds off, not just us
+                        limiter.pause(wait_time)
                     await asyncio.sleep(wait_time)
                 else:
                     # yield StreamEvent(type=StreamEventType.ERROR,error=f"Rate limit exceeded : {e}")
@@ -86,7 +190,8 @@ class LLMClient:
                 
             except APIConnectionError as e:
                 if attempt < self._max_retries:
-                    wait_time = 2**attempt
+                    wait_time = backoff_delay(attempt)
+                    span.event("retry", reason="connection", attempt=attempt, delay_s=wait_time)
                     await asyncio.sleep(wait_time)
                 else:
                     yield StreamEvent.stream_error(error=f"Connection Error  : {e}")
@@ -107,38 +212,44 @@ class LLMClient:
 
         usage : Optional[TokenUsage] = None
         finish_reason : Optional[str] = None
+        assembler = ToolCallAssembler()
 
-        async for chunk in response:
-            if hasattr(chunk,"usage") and chunk.usage:
-                usage = TokenUsage(
-                prompt_tokens=chunk.usage.prompt_tokens,
-                completion_tokens= chunk.usage.completion_tokens,
-                total_tokens= chunk.usage.total_tokens,
-                cached_tokens= chunk.usage.prompt_tokens_details.cached_tokens,
-            )
-            
-            if not chunk.choices:
-                continue
-            choice = chunk.choices[0]
-            delta = choice.delta
-
-            if choice.finish_reason:
-                finish_reason = choice.finish_reason
-            if delta.content:
-                yield StreamEvent(type=StreamEventType.TEXT_DELTA,
-                                  text_delta=TextDelta(delta.content))
+        try:
+            async for chunk in response:
+                if hasattr(chunk,"usage") and chunk.usage:
+                    usage = _token_usage(chunk.usage)
                 
-            print(delta.tool_calls)
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+                if delta.content:
+                    yield StreamEvent(type=StreamEventType.TEXT_DELTA,
+                                      text_delta=TextDelta(delta.content))
+
+                for tool_call in assembler.feed(delta.tool_calls):
+                    yield StreamEvent(type=StreamEventType.TOOL_CALL_COMPLETE,
+                                      tool_call=tool_call)
+        finally:
+            # a cancelled hedge must hand its connection back to the pool
+            await response.close()
+
+        for tool_call in assembler.finish():
+            yield StreamEvent(type=StreamEventType.TOOL_CALL_COMPLETE,
+                              tool_call=tool_call)
         yield StreamEvent(type=StreamEventType.MESSAGE_COMPLETE,
                           finish_reason=finish_reason,
-                          usage=usage)
+                          usage=usage,
+                          tool_calls=assembler.get_tool_calls(),
+                          model=kwargs["model"])
                 
 
     async def _non_stream_response(self,client : AsyncOpenAI, kwargs : dict[str,Any]):
 
         response = await client.chat.completions.create(**kwargs)
-        print(response)
-        print()
 
         choice = response.choices[0]
         message = choice.message
@@ -148,14 +259,13 @@ class LLMClient:
         if message.content:
             text_delta = TextDelta(content=message.content)
         if response.usage:
-            usage = TokenUsage(
-                prompt_tokens=response.usage.prompt_tokens,
-                completion_tokens= response.usage.completion_tokens,
-                total_tokens= response.usage.total_tokens,
-                cached_tokens= response.usage.prompt_tokens_details.cached_tokens,
-            )
+            usage = _token_usage(response.usage)
+        tool_calls = [parse_tool_call(tool_call.id, tool_call.function.name, tool_call.function.arguments)
+                      for tool_call in message.tool_calls or []]
         return StreamEvent(
             type=StreamEventType.TEXT_DELTA,
             text_delta=text_delta,
             finish_reason= choice.finish_reason,
-            usage= usage)
\ No newline at end of file
+            usage= usage,
+            tool_calls= tool_calls,
+            model= kwargs["model"])
\ No newline at end of file
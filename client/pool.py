@@ -0,0 +1,127 @@
+from __future__ import annotations
+import asyncio
+import importlib.util
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name : str, default : bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ("0", "false", "no", "off")
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections : int = field(default_factory=lambda: int(os.environ.get("CODY_HTTP_MAX_CONNECTIONS", 100)))
+    max_keepalive_connections : int = field(default_factory=lambda: int(os.environ.get("CODY_HTTP_MAX_KEEPALIVE", 20)))
+    keepalive_expiry : float = field(default_factory=lambda: float(os.environ.get("CODY_HTTP_KEEPALIVE_SECONDS", 120)))
+    # HTTP/2 multiplexes concurrent streams over one connection, but needs h2
+    http2 : bool = field(default_factory=lambda: _env_flag("CODY_HTTP2", importlib.util.find_spec("h2") is not None))
+    connect_timeout : float = 10.0
+    read_timeout : float = 600.0
+
+
+class ClientPool:
+    
+    # one AsyncOpenAI (and so one httpx connection pool) per endpoint, shared
+    # by every LLMClient in the process
+    def __init__(self, config : Optional[PoolConfig] = None):
+        self.config = config or PoolConfig()
+        self._clients : dict[tuple[str, str], AsyncOpenAI] = {}
+        # the httpx client handed to each AsyncOpenAI as http_client
+        self._http_clients : dict[tuple[str, str], httpx.AsyncClient] = {}
+        self._loop : Optional[asyncio.AbstractEventLoop] = None
+        self._warm_ups : set[asyncio.Task] = set()
+        self._closing : set[asyncio.Task] = set()
+        
+    def _http_client(self) -> httpx.AsyncClient:
+        import httpx
+        from openai import DefaultAsyncHttpxClient
+        config = self.config
+        return DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=config.max_connections,
+                                max_keepalive_connections=config.max_keepalive_connections,
+                                keepalive_expiry=config.keepalive_expiry),
+            timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            http2=config.http2,
+        )
+        
+    def get(self, base_url : str, api_key : str) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # connections belong to the loop that opened them; close the old
+            # clients instead of leaking their sockets
+            stale, self._clients, self._http_clients = list(self._clients.values()), {}, {}
+            self._loop = loop
+            if stale:
+                task = asyncio.create_task(self._close_clients(stale))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+            
+        key = (base_url, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI
+            http_client = self._http_clients[key] = self._http_client()
+            # retries (and Retry-After handling) happen in LLMClient
+            client = self._clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                                      http_client=http_client,
+                                                      max_retries=0)
+        return client
+    
+    @staticmethod
+    async def _close_clients(clients : list[AsyncOpenAI]) -> None:
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                # sockets of a loop that is already closed may refuse
+                logger.debug(f"Closing a stale client failed : {e}")
+    
+    def warm_up(self, base_url : str, api_key : str) -> asyncio.Task:
+        # open the TCP/TLS connection while the rest of startup runs; the
+        # response itself does not matter
+        async def connect():
+            try:
+                self.get(base_url, api_key)
+                await self._http_clients[(base_url, api_key)].head(base_url)
+            except Exception as e:
+                logger.debug(f"Connection warm-up failed : {e}")
+                
+        task = asyncio.create_task(connect())
+        self._warm_ups.add(task)
+        task.add_done_callback(self._warm_ups.discard)
+        return task
+    
+    async def close(self) -> None:
+        for task in list(self._warm_ups):
+            task.cancel()
+        clients, self._clients, self._http_clients = list(self._clients.values()), {}, {}
+        await self._close_clients(clients)
+        for task in list(self._closing):
+            await task
+
+
+_pool : Optional[ClientPool] = None
+
+
+def get_client_pool() -> ClientPool:
+    global _pool
+    if _pool is None:
+        _pool = ClientPool()
+    return _pool
+
+
+async def close_client_pool() -> None:
+    if _pool is not None:
+        await _pool.close()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from client.response import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    # USD per million tokens
+    input : float = 0.0
+    output : float = 0.0
+    # cached prompt tokens are usually billed at a discount
+    cached_input : Optional[float] = None
+
+    def cost(self, usage : TokenUsage) -> float:
+        cached = min(usage.cached_tokens, usage.prompt_tokens)
+        cached_price = self.input if self.cached_input is None else self.cached_input
+        return ((usage.prompt_tokens - cached) * self.input
+                + cached * cached_price
+                + usage.completion_tokens * self.output) / 1_000_000
+
+
+FREE = ModelPrice()
+
+# list prices; override or extend with CODY_PRICING_FILE
+DEFAULT_PRICES : dict[str, ModelPrice] = {
+    "openai/gpt-4o": ModelPrice(input=2.50, output=10.00, cached_input=1.25),
+    "openai/gpt-4o-mini": ModelPrice(input=0.15, output=0.60, cached_input=0.075),
+    "openai/gpt-4.1": ModelPrice(input=2.00, output=8.00, cached_input=0.50),
+    "openai/gpt-4.1-mini": ModelPrice(input=0.40, output=1.60, cached_input=0.10),
+    "anthropic/claude-3.5-haiku": ModelPrice(input=0.80, output=4.00, cached_input=0.08),
+    "google/gemini-2.0-flash-001": ModelPrice(input=0.10, output=0.40, cached_input=0.025),
+}
+
+
+class PriceTable:
+
+    def __init__(self, prices : Optional[dict[str, ModelPrice]] = None):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self._unknown : set[str] = set()
+
+    @classmethod
+    def from_env(cls) -> PriceTable:
+        # {"model": {"input": 0.15, "output": 0.60, "cached_input": 0.075}, ...}
+        table = cls()
+        path = os.environ.get("CODY_PRICING_FILE")
+        if path:
+            try:
+                data = json.loads(Path(path).expanduser().read_text())
+                table.prices.update({model: ModelPrice(**price) for model, price in data.items()})
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Could not load pricing from {path} : {e}")
+        return table
+
+    def price_for(self, model : Optional[str]) -> ModelPrice:
+        if not model:
+            return FREE
+        price = self.prices.get(model)
+        if price is not None:
+            return price
+        # OpenRouter's ":free" variants cost nothing
+        if model.endswith(":free"):
+            return FREE
+        base = self.prices.get(model.split(":", 1)[0])
+        if base is not None:
+            return base
+        if model not in self._unknown:
+            self._unknown.add(model)
+            logger.warning(f"No price known for {model}; counting its cost as 0")
+        return FREE
+
+    def cost(self, model : Optional[str], usage : TokenUsage) -> float:
+        return self.price_for(model).cost(usage)
+
+
+_table : Optional[PriceTable] = None
+
+
+def get_price_table() -> PriceTable:
+    global _table
+    if _table is None:
+        _table = PriceTable.from_env()
+    return _table
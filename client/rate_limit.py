@@ -0,0 +1,122 @@
+from __future__ import annotations
+import asyncio
+import email.utils
+import os
+import random
+import time
+from typing import Any, Optional
+
+
+class TokenBucket:
+    
+    def __init__(self, per_minute : float, capacity : Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        
+    def _refill(self, now : float) -> None:
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self._updated = max(now, self._updated)
+        
+    def wait_time(self, amount : float) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        paused = max(0.0, self._paused_until - now)
+        # a request larger than the whole bucket only waits for a full bucket
+        needed = min(amount, self.capacity) - self.tokens
+        return paused + (needed / self.rate if needed > 0 else 0.0)
+    
+    def take(self, amount : float) -> None:
+        self.tokens -= amount
+        
+    def pause(self, seconds : float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    
+    # shared by every session talking to the same endpoint, so a burst of
+    # sessions queues up here instead of tripping the provider's 429s
+    def __init__(self, requests_per_minute : float = 0, tokens_per_minute : float = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = asyncio.Lock()
+        
+    async def acquire(self, estimated_tokens : int = 0) -> float:
+        # returns how long the caller was held back
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1) if self.requests else 0.0,
+                           self.tokens.wait_time(estimated_tokens) if self.tokens else 0.0)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(estimated_tokens)
+        return time.monotonic() - started
+    
+    def settle(self, estimated_tokens : int, actual_tokens : int) -> None:
+        if self.tokens:
+            self.tokens.take(actual_tokens - estimated_tokens)
+            
+    def pause(self, seconds : float) -> None:
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.pause(seconds)
+
+
+_limiters : dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(base_url : str) -> Optional[RateLimiter]:
+    requests_per_minute = float(os.environ.get("CODY_RATE_LIMIT_RPM", 0))
+    tokens_per_minute = float(os.environ.get("CODY_RATE_LIMIT_TPM", 0))
+    if requests_per_minute <= 0 and tokens_per_minute <= 0:
+        return None
+    limiter = _limiters.get(base_url)
+    if limiter is None:
+        limiter = _limiters[base_url] = RateLimiter(requests_per_minute, tokens_per_minute)
+    return limiter
+
+
+def retry_after(error : Any) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+        
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt : int, error : Any = None, base : float = 1.0, cap : float = 60.0) -> float:
+    # the server knows best; otherwise full jitter so that sessions that
+    # failed together do not retry together
+    delay = retry_after(error) if error is not None else None
+    if delay is not None:
+        return min(delay, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable
+
+from client.response import StreamEvent, StreamEventType
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+# only these kwargs decide what the model sees
+_KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "stream")
+
+
+class ReplayMode(str, Enum):
+    OFF = "off"
+    RECORD = "record"
+    REPLAY = "replay"
+    # replay on a hit, record on a miss
+    AUTO = "auto"
+
+
+class ReplayCache:
+    
+    def __init__(self, directory : Path, mode : ReplayMode = ReplayMode.AUTO, speed : float = 0.0):
+        self.directory = directory
+        self.mode = mode
+        # 1.0 replays with the recorded timing, 10.0 ten times faster,
+        # 0 (or less) without any delay
+        self.speed = speed
+        self.hits = 0
+        self.misses = 0
+        
+    @classmethod
+    def from_env(cls) -> ReplayCache | None:
+        mode = ReplayMode(os.environ.get("CODY_LLM_CACHE", ReplayMode.OFF.value).lower())
+        if mode == ReplayMode.OFF:
+            return None
+        directory = Path(os.environ.get("CODY_LLM_CACHE_DIR",
+                                        Path(os.environ.get("CODY_CACHE_DIR", Path.home() / ".cache" / "cody")) / "llm"))
+        return cls(directory, mode, float(os.environ.get("CODY_LLM_REPLAY_SPEED", 0)))
+    
+    @staticmethod
+    def key_for(kwargs : dict[str, Any]) -> str:
+        canonical = json.dumps({field: kwargs.get(field) for field in _KEY_FIELDS},
+                               sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def _path(self, key : str) -> Path:
+        return self.directory / key[:2] / f"{key}.jsonl"
+    
+    async def wrap(self, kwargs : dict[str, Any],
+                   produce : Callable[[], AsyncGenerator[StreamEvent, None]]) -> AsyncGenerator[StreamEvent, None]:
+        key = self.key_for(kwargs)
+        path = self._path(key)
+        
+        if self.mode in (ReplayMode.REPLAY, ReplayMode.AUTO) and path.exists():
+            self.hits += 1
+            async for event in self._replay(path):
+                yield event
+            return
+        
+        self.misses += 1
+        if self.mode == ReplayMode.REPLAY:
+            yield StreamEvent.stream_error(error=f"No recorded response for request {key[:12]} in {self.directory}")
+            return
+        
+        recorded : list[tuple[float, dict[str, Any]]] = []
+        started = time.perf_counter()
+        complete = True
+        async for event in produce():
+            if event.type == StreamEventType.ERROR:
+                complete = False
+            recorded.append((time.perf_counter() - started, event.to_dict()))
+            yield event
+            
+        if complete and recorded:
+            await asyncio.to_thread(self._write, path, kwargs.get("model"), recorded)
+            
+    def _write(self, path : Path, model : str | None, recorded : list[tuple[float, dict[str, Any]]]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": _FORMAT_VERSION, "model": model, "recorded_at": time.time()}) + "\n")
+            for offset, event in recorded:
+                f.write(json.dumps({"t": round(offset, 6), "event": event}) + "\n")
+        os.replace(tmp, path)
+        
+    async def _replay(self, path : Path) -> AsyncGenerator[StreamEvent, None]:
+        lines = (await asyncio.to_thread(path.read_text, encoding="utf-8")).splitlines()
+        started = time.perf_counter()
+        for line in lines[1:]:
+            entry = json.loads(line)
+            if self.speed > 0:
+                delay = entry["t"] / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield StreamEvent.from_dict(entry["event"])
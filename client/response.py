@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from enum import Enum
-from typing import Optional
+from typing import Any, Optional
 
 @dataclass
 class TextDelta:
@@ -15,6 +15,7 @@ class TextDelta:
 class StreamEventType(str, Enum):
     
     TEXT_DELTA = "text_delta"
+    TOOL_CALL_COMPLETE = "tool_call_complete"
     MESSAGE_COMPLETE  ="message_complete"
     ERROR = "error"
 
@@ -33,6 +34,19 @@ class TokenUsage:
                           cached_tokens= self.cached_tokens + other.cached_tokens)
 
 
+@dataclass
+class ToolCall:
+    call_id : str
+    name : str
+    arguments : dict[str, Any] = field(default_factory=dict)
+    raw_arguments : str = ""
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"id": self.call_id,
+                "type": "function",
+                "function": {"name": self.name,
+                             "arguments": self.raw_arguments or "{}"}}
+
 
 @dataclass
 class StreamEvent:
@@ -42,7 +56,32 @@ class StreamEvent:
     error : Optional[str] = None
     finish_reason : Optional[str] = None
     usage : Optional[TokenUsage] = None
+    tool_call : Optional[ToolCall] = None
+    tool_calls : list[ToolCall] = field(default_factory=list)
+    # the model that actually answered (hedging and failover may pick another)
+    model : Optional[str] = None
 
     @classmethod
     def stream_error(cls, error : str):
-        return cls(type= StreamEventType.ERROR, error=error)
\ No newline at end of file
+        return cls(type= StreamEventType.ERROR, error=error)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"type": self.type.value,
+                "text_delta": self.text_delta.content if self.text_delta else None,
+                "error": self.error,
+                "finish_reason": self.finish_reason,
+                "usage": asdict(self.usage) if self.usage else None,
+                "tool_call": asdict(self.tool_call) if self.tool_call else None,
+                "tool_calls": [asdict(call) for call in self.tool_calls],
+                "model": self.model}
+
+    @classmethod
+    def from_dict(cls, data : dict[str, Any]) -> StreamEvent:
+        return cls(type= StreamEventType(data["type"]),
+                   text_delta= TextDelta(data["text_delta"]) if data.get("text_delta") is not None else None,
+                   error= data.get("error"),
+                   finish_reason= data.get("finish_reason"),
+                   usage= TokenUsage(**data["usage"]) if data.get("usage") else None,
+                   tool_call= ToolCall(**data["tool_call"]) if data.get("tool_call") else None,
+                   tool_calls= [ToolCall(**call) for call in data.get("tool_calls") or []],
+                   model= data.get("model"))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from client.response import ToolCall
+
+
+@dataclass
+class _PendingCall:
+    index : int
+    call_id : str = ""
+    name : str = ""
+    arguments : str = ""
+    depth : int = 0
+    in_string : bool = False
+    escaped : bool = False
+    emitted : bool = False
+    
+    def feed(self, fragment : str) -> bool:
+        # Track brace depth outside of string literals so we know when the
+        # top level object closes without re-parsing the whole buffer.
+        closed = False
+        for char in fragment:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    closed = True
+        self.arguments += fragment
+        return closed
+    
+
+def parse_tool_call(call_id : str, name : str, arguments : str) -> ToolCall:
+    try:
+        parsed = json.loads(arguments) if arguments else {}
+    except json.JSONDecodeError:
+        parsed = {}
+    if not isinstance(parsed, dict):
+        parsed = {}
+    return ToolCall(call_id=call_id, name=name, arguments=parsed, raw_arguments=arguments)
+
+
+class ToolCallAssembler:
+    
+    def __init__(self):
+        self._calls : dict[int, _PendingCall] = {}
+        
+    def feed(self, tool_call_deltas : list[Any] | None) -> list[ToolCall]:
+        completed : list[ToolCall] = []
+        
+        for tool_call_delta in tool_call_deltas or []:
+            index = tool_call_delta.index
+            if index not in self._calls:
+                # providers stream calls one after another, so a new index
+                # means every earlier call has received all of its fragments
+                for pending in self._calls.values():
+                    if not pending.emitted:
+                        completed.append(self._emit(pending))
+                self._calls[index] = _PendingCall(index=index)
+                
+            pending = self._calls[index]
+            if tool_call_delta.id:
+                pending.call_id = tool_call_delta.id
+            function = tool_call_delta.function
+            if not function:
+                continue
+            if function.name:
+                pending.name = function.name
+            if function.arguments and pending.feed(function.arguments) and not pending.emitted:
+                if self._is_complete_json(pending.arguments):
+                    completed.append(self._emit(pending))
+                    
+        return completed
+    
+    def finish(self) -> list[ToolCall]:
+        return [self._emit(pending) for pending in self._calls.values() if not pending.emitted]
+    
+    def get_tool_calls(self) -> list[ToolCall]:
+        return [self._build(pending) for _, pending in sorted(self._calls.items())]
+        
+    def _is_complete_json(self, arguments : str) -> bool:
+        try:
+            json.loads(arguments)
+        except json.JSONDecodeError:
+            return False
+        return True
+    
+    def _emit(self, pending : _PendingCall) -> ToolCall:
+        pending.emitted = True
+        return self._build(pending)
+    
+    def _build(self, pending : _PendingCall) -> ToolCall:
+        return parse_tool_call(pending.call_id or f"call_{pending.index}", pending.name, pending.arguments)
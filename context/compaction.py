@@ -0,0 +1,115 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from client.llm_client import LLMClient
+from client.response import StreamEventType, TokenUsage
+from context.manager import ContextManager
+from prompts.system import get_compression_prompt
+from utils.text import fit_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class ContextCompactor:
+    
+    CONTEXT_WINDOW = 128_000
+    # compact once the context reaches this fraction of the window ...
+    COMPACT_THRESHOLD = 0.8
+    # ... but start summarizing in the background from this fraction on, so
+    # the summary is usually ready by the time it is needed
+    PREFETCH_THRESHOLD = 0.6
+    KEEP_RECENT_TURNS = 2
+    KEEP_RECENT_MESSAGES = 8
+    # how much of the window the transcript sent for summarization may use
+    TRANSCRIPT_BUDGET = 0.5
+    
+    def __init__(self, client : LLMClient, context_manager : ContextManager,
+                 context_window : int | None = None,
+                 compact_threshold : float | None = None,
+                 prefetch_threshold : float | None = None,
+                 keep_recent_turns : int | None = None,
+                 on_usage : Callable[[Optional[str], TokenUsage], None] | None = None):
+        self.client = client
+        self.context_manager = context_manager
+        self.context_window = context_window or self.CONTEXT_WINDOW
+        self.compact_threshold = compact_threshold or self.COMPACT_THRESHOLD
+        self.prefetch_threshold = min(prefetch_threshold or self.PREFETCH_THRESHOLD, self.compact_threshold)
+        self.keep_recent_turns = keep_recent_turns or self.KEEP_RECENT_TURNS
+        # gets (model, usage) of every summary request, for cost accounting
+        self.on_usage = on_usage
+        self._task : Optional[asyncio.Task[Optional[tuple[int, int, str]]]] = None
+        
+    def _usage(self) -> float:
+        return self.context_manager.total_tokens / self.context_window
+        
+    def should_compact(self) -> bool:
+        return self._usage() >= self.compact_threshold
+    
+    def schedule(self) -> None:
+        if self._task is not None or self._usage() < self.prefetch_threshold:
+            return
+        split = self.context_manager.split_index(self.keep_recent_turns, self.KEEP_RECENT_MESSAGES)
+        if split <= 0:
+            return
+        self._task = asyncio.create_task(self._summarize(self.context_manager.generation, split))
+        
+    async def compact_if_needed(self) -> bool:
+        if not self.should_compact():
+            return False
+        
+        self.schedule()
+        if self._task is None:
+            return False
+        
+        task, self._task = self._task, None
+        result = await task
+        if result is None:
+            return False
+        
+        generation, split, summary = result
+        if generation != self.context_manager.generation:
+            # history was replaced since the snapshot was taken
+            return False
+        
+        self.context_manager.replace_prefix(split, summary)
+        logger.debug(f"Compacted {split} messages, context now {self.context_manager.total_tokens} tokens")
+        return True
+    
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _summarize(self, generation : int, split : int) -> Optional[tuple[int, int, str]]:
+        transcript = fit_tokens(
+            self.context_manager.render_transcript(split),
+            int(self.context_window * self.TRANSCRIPT_BUDGET),
+            self.context_manager.model_name,
+            suffix= "\n\n... [middle of conversation omitted] ...\n\n",
+            tail_tokens= int(self.context_window * self.TRANSCRIPT_BUDGET / 2),
+        ).text
+        messages = [
+            {"role": "system", "content": self.context_manager.system_prompt},
+            {"role": "user", "content": f"Conversation so far:\n\n{transcript}"},
+            {"role": "user", "content": get_compression_prompt()},
+        ]
+        
+        summary = ""
+        try:
+            async for event in self.client.chat_completion(messages, stream=False):
+                if event.type == StreamEventType.ERROR:
+                    logger.warning(f"Context compaction failed : {event.error}")
+                    return None
+                if event.usage and self.on_usage is not None:
+                    self.on_usage(event.model, event.usage)
+                if event.text_delta:
+                    summary += event.text_delta.content
+        except Exception:
+            logger.exception("Context compaction raised unexpected error !")
+            return None
+        
+        if not summary.strip():
+            return None
+        return generation, split, summary
@@ -0,0 +1,187 @@
+from __future__ import annotations
+# Append-only journal of a session's context. Every message (with its token
+# count) is one JSON line; compactions are recorded as a rewrite of the
+# prefix. Every SNAPSHOT_EVERY records the whole history is written to a
+# snapshot together with the journal offset it covers, so resuming reads the
+# snapshot plus the journal tail and never tokenizes anything again.
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Any, Optional
+
+from context.manager import ContextManager, MessageItem
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_DIR = Path(os.environ.get("CODY_SESSIONS_DIR",
+                                   Path(os.environ.get("CODY_CACHE_DIR", Path.home() / ".cache" / "cody")) / "sessions"))
+
+
+def new_session_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+@dataclass
+class SessionInfo:
+    session_id : str
+    created : float
+    updated : float
+    cwd : Optional[str] = None
+    title : Optional[str] = None
+
+    @classmethod
+    def load(cls, directory : Path) -> SessionInfo:
+        meta = json.loads((directory / SessionJournal.META_FILE).read_text())
+        journal = directory / SessionJournal.JOURNAL_FILE
+        updated = journal.stat().st_mtime if journal.exists() else meta.get("created", 0.0)
+        return cls(session_id=directory.name, created=meta.get("created", 0.0), updated=updated,
+                   cwd=meta.get("cwd"), title=meta.get("title"))
+
+
+class SessionJournal:
+
+    JOURNAL_FILE = "journal.jsonl"
+    SNAPSHOT_FILE = "snapshot.json"
+    META_FILE = "meta.json"
+    SNAPSHOT_EVERY = 200
+    TITLE_CHARS = 80
+
+    def __init__(self, session_id : str, directory : Path = SESSIONS_DIR):
+        self.session_id = session_id
+        self.directory = directory / session_id
+        self._file : Optional[IO[str]] = None
+        self._pending = 0
+        self._since_snapshot = 0
+        self._context : Optional[ContextManager] = None
+
+    @classmethod
+    def create(cls, cwd : Optional[Path] = None, directory : Path = SESSIONS_DIR) -> SessionJournal:
+        journal = cls(new_session_id(), directory)
+        journal.directory.mkdir(parents=True, exist_ok=True)
+        journal._write_meta({"created": time.time(), "cwd": str(cwd or Path.cwd()), "title": None})
+        return journal
+
+    @classmethod
+    def open(cls, session_id : str, directory : Path = SESSIONS_DIR) -> SessionJournal:
+        journal = cls(session_id, directory)
+        if not (journal.directory / cls.META_FILE).exists():
+            raise ValueError(f"Unknown session {session_id}")
+        return journal
+
+    @staticmethod
+    def list_sessions(directory : Path = SESSIONS_DIR) -> list[SessionInfo]:
+        sessions = []
+        for path in directory.iterdir() if directory.is_dir() else []:
+            try:
+                sessions.append(SessionInfo.load(path))
+            except (OSError, ValueError):
+                continue
+        return sorted(sessions, key=lambda info: info.updated, reverse=True)
+
+    def _write_meta(self, meta : dict[str, Any]) -> None:
+        self._replace(self.directory / self.META_FILE, json.dumps(meta))
+
+    def _replace(self, path : Path, text : str) -> None:
+        # write-then-rename so a crash leaves either the old file or the new one
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def set_title(self, prompt : str) -> None:
+        meta = json.loads((self.directory / self.META_FILE).read_text())
+        if meta.get("title"):
+            return
+        meta["title"] = " ".join(prompt.split())[:self.TITLE_CHARS]
+        self._write_meta(meta)
+
+    def restore(self, context : ContextManager) -> int:
+        # loads the snapshot and replays the journal after it, then keeps
+        # journaling whatever the context manager appends
+        messages : list[MessageItem] = []
+        generation, offset = 0, 0
+        snapshot = self.directory / self.SNAPSHOT_FILE
+        if snapshot.exists():
+            data = json.loads(snapshot.read_text())
+            messages = [MessageItem(**item) for item in data["messages"]]
+            generation, offset = data["generation"], data["offset"]
+
+        path = self.directory / self.JOURNAL_FILE
+        replayed = 0
+        if path.exists():
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    item = MessageItem(**record["item"])
+                    if record["op"] == "compact":
+                        messages = [item] + messages[record["end"]:]
+                        generation += 1
+                    else:
+                        messages.append(item)
+                    offset += len(line)
+                    replayed += 1
+            # drop a line cut short by a crash so new records start clean
+            if offset < path.stat().st_size:
+                os.truncate(path, offset)
+
+        context.restore(messages, generation)
+        self._since_snapshot = replayed
+        self.attach(context)
+        logger.debug(f"Restored session {self.session_id} : {len(messages)} messages, {replayed} replayed")
+        return len(messages)
+
+    def attach(self, context : ContextManager) -> None:
+        self._context = context
+        context.journal = self
+        if self._file is None:
+            self._file = open(self.directory / self.JOURNAL_FILE, "a", encoding="utf-8")
+
+    def _write(self, record : dict[str, Any]) -> None:
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._pending += 1
+        self._since_snapshot += 1
+
+    def append(self, item : MessageItem) -> None:
+        self._write({"op": "add", "item": asdict(item)})
+
+    def compact(self, end : int, item : MessageItem) -> None:
+        self._write({"op": "compact", "end": end, "item": asdict(item)})
+
+    async def commit(self) -> None:
+        # one fsync for everything written since the last commit; the agent
+        # commits once per turn rather than once per message
+        if self._file is None or not self._pending:
+            return
+        self._pending = 0
+        self._file.flush()
+        await asyncio.to_thread(os.fsync, self._file.fileno())
+        if self._since_snapshot >= self.SNAPSHOT_EVERY:
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        if self._file is None or self._context is None:
+            return
+        self._file.flush()
+        data = {"generation": self._context.generation, "offset": self._file.tell(),
+                "messages": [asdict(item) for item in self._context.messages]}
+        self._replace(self.directory / self.SNAPSHOT_FILE, json.dumps(data, separators=(",", ":")))
+        self._since_snapshot = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
@@ -1,47 +1,153 @@
-from typing import Any
+import json
+from typing import TYPE_CHECKING, Any, Optional
 
 from prompts.system import get_system_prompt
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from utils.text import count_tokens
+
+if TYPE_CHECKING:
+    from context.journal import SessionJournal
 @dataclass
 class MessageItem:
     role : str
     content : str
     token_count : int | None = None
+    tool_call_id : str | None = None
+    tool_calls : list[dict[str, Any]] = field(default_factory=list)
     
     
     def to_dict(self) -> dict[str,Any]:
         result  = {"role":self.role}
         
+        if self.tool_call_id:
+            result['tool_call_id'] = self.tool_call_id
+        if self.tool_calls:
+            result['tool_calls'] = self.tool_calls
         if self.content:
             result['content'] = self.content
         return result
 
 class ContextManager:
+    
+    # role/separator tokens the chat format adds around every message
+    MESSAGE_OVERHEAD_TOKENS = 4
+    MODEL_NAME = "arcee-ai/trinity-large-preview:free"
+    
     def __init__(self) -> None:
         
         # tells ai how to behave
         self.system_prompt = get_system_prompt()
-        self.model_name = "arcee-ai/trinity-large-preview:free"
+        self.model_name = self.MODEL_NAME
         self._messages : list[MessageItem] = []
         
+        self._system_tokens = self._count(self.system_prompt) + self.MESSAGE_OVERHEAD_TOKENS if self.system_prompt else 0
+        self._tool_schema_tokens = 0
+        self._message_tokens = 0
+        # bumped whenever history is rewritten rather than appended to
+        self.generation = 0
+        # set by SessionJournal.attach; gets every change to the history
+        self.journal : Optional["SessionJournal"] = None
+        
+    @property
+    def total_tokens(self) -> int:
+        return self._system_tokens + self._tool_schema_tokens + self._message_tokens
+    
+    @property
+    def message_count(self) -> int:
+        return len(self._messages)
+    
+    @property
+    def messages(self) -> list[MessageItem]:
+        return self._messages
+    
+    def _count(self, text : str | None) -> int:
+        return count_tokens(text, self.model_name) if text else 0
+    
+    def _append(self, item : MessageItem) -> None:
+        self._messages.append(item)
+        self._message_tokens += (item.token_count or 0) + self.MESSAGE_OVERHEAD_TOKENS
+        if self.journal is not None:
+            self.journal.append(item)
+        
+    def set_tool_schemas(self, schemas : list[dict[str, Any]] | None) -> None:
+        self._tool_schema_tokens = self._count(json.dumps(schemas)) if schemas else 0
+        
     def add_user_(self,content : str ) -> None:
         
         item = MessageItem(role='user',
                            content = content,
-                           token_count =count_tokens(content,self.model_name))
-        self._messages.append(item)
+                           token_count =self._count(content))
+        self._append(item)
         
     
-    def add_assistant_messages(self,content : str ) -> None:
+    def add_assistant_messages(self,content : str, tool_calls : list[dict[str, Any]] | None = None ) -> None:
         
-        item = MessageItem(role='assitant',
+        token_count = self._count(content)
+        for call in tool_calls or []:
+            function = call.get("function", {})
+            token_count += self._count(function.get("name")) + self._count(function.get("arguments"))
+            
+        item = MessageItem(role='assistant',
                            content = content or "",
-                           token_count =count_tokens(content,self.model_name))
-        self._messages.append(item)
+                           token_count =token_count,
+                           tool_calls = tool_calls or [])
+        self._append(item)
+        
+    def add_tool_result(self, tool_call_id : str, content : str) -> None:
         
+        item = MessageItem(role='tool',
+                           content = content,
+                           token_count =self._count(content),
+                           tool_call_id = tool_call_id)
+        self._append(item)
+    
+    def split_index(self, keep_recent_turns : int, keep_recent_messages : int) -> int:
+        # index of the first message to keep verbatim; everything before it
+        # can be summarized
+        user_indexes = [i for i, item in enumerate(self._messages) if item.role == 'user']
+        if len(user_indexes) > keep_recent_turns:
+            split = user_indexes[-keep_recent_turns]
+        else:
+            split = len(self._messages) - keep_recent_messages
+            
+        # never separate tool results from the assistant call that produced them
+        while 0 < split < len(self._messages) and self._messages[split].role == 'tool':
+            split += 1
+        return max(0, min(split, len(self._messages)))
+    
+    def render_transcript(self, end : int) -> str:
+        parts = []
+        for item in self._messages[:end]:
+            if item.content:
+                parts.append(f"[{item.role}]\n{item.content}")
+            for call in item.tool_calls:
+                function = call.get("function", {})
+                parts.append(f"[{item.role} tool call]\n{function.get('name')}({function.get('arguments')})")
+        return "\n\n".join(parts)
     
+    def replace_prefix(self, end : int, summary : str) -> None:
+        content = f"[Summary of the earlier conversation]\n\n{summary}"
+        item = MessageItem(role='user',
+                           content = content,
+                           token_count =self._count(content))
+        self._messages = [item] + self._messages[end:]
+        # stored per-message counts are reused, only the summary is tokenized
+        self._recount()
+        self.generation += 1
+        if self.journal is not None:
+            self.journal.compact(end, item)
+        
+    def restore(self, messages : list[MessageItem], generation : int) -> None:
+        # history read back from a journal already carries its token counts
+        self._messages = list(messages)
+        self._recount()
+        self.generation = generation
+        
+    def _recount(self) -> None:
+        self._message_tokens = sum((message.token_count or 0) + self.MESSAGE_OVERHEAD_TOKENS
+                                   for message in self._messages)
+        
     def get_messages(self):
         messages = []
         
@@ -51,4 +157,4 @@ class ContextManager:
             messages.append(item.to_dict())
             
         return messages
-        
\ No newline at end of file
+        
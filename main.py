@@ -1,64 +1,273 @@
+import sys
+from utils import startup
+if "--profile-startup" in sys.argv:
+    # installed before anything else is imported so every import is timed
+    startup.enable_profiling()
+
 import asyncio
-from typing import Optional, Any
+import importlib
+import time
+from typing import TYPE_CHECKING, Optional, Any
 import click
-import sys
+from pathlib import Path
 from agent.agent import Agent
+from agent.budget import Budget
 from agent.event import AgentEventType
+from client.llm_client import LLMClient
+from client.pool import close_client_pool
+from context.manager import ContextManager
 from ui.tui import TUI,get_console
+from utils.text import get_encoding
+from utils.tracing import configure_tracing
+
+if TYPE_CHECKING:
+    # batch, daemon, pipeline and journal modules are imported where they are used
+    from agent.pipeline import EventSubscription
+    from context.journal import SessionJournal
 
 
 console = get_console()
+startup.mark("imports")
 class CLI:
 
-    def __init__(self):
+    def __init__(self, warm_up : bool = True, markdown : bool = False, event_log : Optional[Path] = None,
+                 budget : Optional[Budget] = None, journal : Optional["SessionJournal"] = None):
         self.agent = Optional[Agent]
-        self.tui = TUI(console)
+        self.tui = TUI(console, markdown=markdown)
+        self.warm_up = warm_up
+        self.event_log = event_log
+        self.budget = budget
+        self.journal = journal
+
+    def preload(self) -> None:
+        # the tokenizer and the HTTP stack load on other threads while the
+        # agent builds its prompt and tool schemas
+        startup.preload(get_encoding, ContextManager.MODEL_NAME)
+        startup.preload(importlib.import_module, "openai")
 
     async def run_single(self,message : str) -> Optional[str]:
-        async with Agent() as agent:
-            self.agent = agent
-            return await self._process_message(message)
+        from context.journal import SessionJournal
+        self.preload()
+        try:
+            client = LLMClient()
+            if self.warm_up:
+                # connect while the agent builds its prompt and tool schemas
+                client.warm_up()
+            journal = self.journal or SessionJournal.create()
+            async with Agent(client=client, budget=self.budget, journal=journal) as agent:
+                startup.mark("agent ready")
+                self.agent = agent
+                result = await self._process_message(message)
+            console.print(f"[dim]Session {journal.session_id} (continue with --resume {journal.session_id})[/dim]")
+            return result
+        finally:
+            await close_client_pool()
+
+    def list_sessions(self) -> None:
+        from context.journal import SessionJournal
+        for info in SessionJournal.list_sessions():
+            updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.updated))
+            click.echo(f"{info.session_id}  {updated}  {info.cwd or ''}  {info.title or ''}")
+
+    async def profile_startup(self) -> None:
+        # everything a prompt goes through before the network call
+        self.preload()
+        async with Agent(client=LLMClient()) as agent:
+            startup.mark("agent ready")
+            agent.context_manager.set_tool_schemas(agent.tool_registry.get_schemas())
+            agent.context_manager.add_user_("profile")
+            agent.context_manager.get_messages()
+            startup.mark("first request")
+
+    async def run_batch(self, input_path : Path, output_path : Path,
+                        concurrency : Optional[int], task_timeout : Optional[float]) -> bool:
+        from agent.batch import BatchRunner
+        try:
+            runner = BatchRunner(input_path, output_path, concurrency=concurrency or BatchRunner.DEFAULT_CONCURRENCY,
+                                 task_timeout=task_timeout,
+                                 budget=self.budget)
+            summary = await runner.run()
+        finally:
+            await close_client_pool()
+        console.print(f"[info]{summary.succeeded} succeeded, {summary.failed} failed, "
+                      f"{summary.skipped} already done of {summary.total} in {summary.wall_seconds:.1f}s[/info]")
+        console.print(f"[dim]{summary.usage.total_tokens} tokens, ${summary.cost:.4f}[/dim]")
+        console.print(f"[dim]Results : {output_path}[/dim]")
+        return summary.failed == 0
+
+    async def serve(self, socket_path : Optional[Path]) -> None:
+        from agent.daemon import DaemonServer
+        from agent.daemon_client import SOCKET_PATH
+        server = DaemonServer(socket_path or SOCKET_PATH)
+        try:
+            await server.start()
+            console.print(f"[info]Serving on {server.socket_path}[/info]")
+            await server.serve_forever()
+        finally:
+            await close_client_pool()
 
     async def _process_message(self,message : str) -> Optional[str]:
+        from agent.pipeline import EventPipeline, write_event_log
         if not self.agent:
             return None
         
+        # the agent runs in its own task; the TUI and the event log consume
+        # at their own pace without slowing down the model's stream
+        async with EventPipeline(self.agent.run(message)) as pipeline:
+            events = pipeline.subscribe()
+            log_task = None
+            if self.event_log:
+                log_task = asyncio.create_task(write_event_log(pipeline.subscribe(), self.event_log))
+            pipeline.start()
+            final_response = await self._render_events(events)
+            if log_task:
+                await log_task
+        return final_response
+
+    async def _render_events(self, events : "EventSubscription") -> Optional[str]:
         assistant_streaming = False
         final_response  = None
         
-        async for event in self.agent.run(message):
+        async for event in events:
             if event.type == AgentEventType.TEXT_DELTA:
-                content = event.data.get("content","")
+                content = event.content or ""
                 if not assistant_streaming:
                     self.tui.begin_assistant()
                     assistant_streaming = True
                 self.tui.stream_assistant_delta(content)
             elif event.type == AgentEventType.TEXT_COMPLETE:
-                final_response = event.data.get("content")
+                final_response = event.content
                 if assistant_streaming:
                     self.tui.end_assistant()
                     assistant_streaming = False
 
+            elif event.type == AgentEventType.TOOL_CALL_START:
+                if assistant_streaming:
+                    self.tui.end_assistant()
+                    assistant_streaming = False
+                tool = self.agent.tool_registry.get(event.data.get("name"))
+                self.tui.tool_call_start(event.data.get("name"),
+                                         event.data.get("arguments",{}),
+                                         tool.kind.value if tool else None)
+            elif event.type == AgentEventType.TOOL_CALL_COMPLETE:
+                self.tui.tool_call_complete(event.data.get("name"),
+                                            event.data.get("success"),
+                                            event.data.get("output",""),
+                                            event.data.get("error"))
+
             elif event.type == AgentEventType.AGENT_ERROR:
+                if assistant_streaming:
+                    self.tui.end_assistant()
+                    assistant_streaming = False
                 error = event.data.get("error","Unknown Error")
                 console.print(f"\n[error]Error : {error}[/error]")
 
+            elif event.type in (AgentEventType.BUDGET_WARNING, AgentEventType.BUDGET_EXCEEDED):
+                if assistant_streaming:
+                    self.tui.end_assistant()
+                    assistant_streaming = False
+                self.tui.budget_notice(event.data.get("message", ""),
+                                       hard=event.type == AgentEventType.BUDGET_EXCEEDED)
+
+            elif event.type == AgentEventType.AGENT_END:
+                self.tui.usage_summary(event.data.get("summary") or {})
+
+        if assistant_streaming:
+            self.tui.end_assistant()
         return final_response
 
             
 
 @click.command()
 @click.argument("prompt",required=False)
+@click.option("--warm-up/--no-warm-up", default=True, help="Open the API connection in the background at startup.")
+@click.option("--batch", "batch_input", type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help="Run every prompt in a JSONL file ({\"id\", \"prompt\", \"cwd\"} per line).")
+@click.option("--output", "batch_output", type=click.Path(dir_okay=False, path_type=Path),
+              help="Where batch results are appended. Defaults to <input>.results.jsonl.")
+@click.option("--concurrency", type=int, default=None,
+              help="Number of batch sessions running at once. Defaults to 4.")
+@click.option("--task-timeout", type=float, default=None, help="Seconds before a batch task is abandoned.")
+@click.option("--serve", is_flag=True, help="Run as a daemon serving sessions on a Unix socket (see agent/daemon_client.py).")
+@click.option("--socket", "socket_path", type=click.Path(path_type=Path), default=None,
+              help="Socket for --serve. Defaults to $CODY_SOCKET or ~/.cache/cody/daemon.sock.")
+@click.option("--markdown/--plain", default=False, help="Render answers as Markdown while they stream.")
+@click.option("--event-log", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="Append every agent event to this file as JSON lines.")
+@click.option("--trace", "trace_file", type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help="Append OpenTelemetry (OTLP/JSON) spans to this file. Also set by CODY_TRACE_FILE.")
+@click.option("--max-tokens", type=int, default=None, help="Stop a run after this many tokens. Also CODY_BUDGET_TOKENS.")
+@click.option("--max-cost", type=float, default=None, help="Stop a run after this many dollars. Also CODY_BUDGET_USD.")
+@click.option("--max-seconds", type=float, default=None, help="Stop a run after this long. Also CODY_BUDGET_SECONDS.")
+@click.option("--resume", "resume_id", default=None, help="Continue a saved session (see --list-sessions).")
+@click.option("--list-sessions", is_flag=True, help="List saved sessions, most recent first.")
+@click.option("--profile-startup", is_flag=True,
+              help="Print import times and startup milestones. Without a prompt, stops before the network call.")
 def main(
     prompt : Optional[str],
+    warm_up : bool,
+    batch_input : Optional[Path],
+    batch_output : Optional[Path],
+    concurrency : Optional[int],
+    task_timeout : Optional[float],
+    serve : bool,
+    socket_path : Optional[Path],
+    markdown : bool,
+    event_log : Optional[Path],
+    trace_file : Optional[Path],
+    max_tokens : Optional[int],
+    max_cost : Optional[float],
+    max_seconds : Optional[float],
+    resume_id : Optional[str],
+    list_sessions : bool,
+    profile_startup : bool,
 ):  
-    print(prompt)
-    cli = CLI()
-    # messages = [{"role":"user","content":prompt}]
+    if trace_file:
+        configure_tracing(trace_file)
+    budget = Budget.from_env()
+    # an explicit 0 is a limit too
+    if max_tokens is not None:
+        budget.max_tokens = max_tokens
+    if max_cost is not None:
+        budget.max_cost = max_cost
+    if max_seconds is not None:
+        budget.max_seconds = max_seconds
+    journal = None
+    if resume_id:
+        from context.journal import SessionJournal
+        try:
+            journal = SessionJournal.open(resume_id)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--resume")
+    cli = CLI(warm_up=warm_up, markdown=markdown, event_log=event_log, budget=budget, journal=journal)
+    if list_sessions:
+        cli.list_sessions()
+        return
+
+    if serve:
+        asyncio.run(cli.serve(socket_path))
+        return
+
+    if batch_input:
+        # tasks already in the output are skipped unless they errored, so rerunning
+        # resumes and retries the failures
+        from agent.batch import default_output_path
+        ok = asyncio.run(cli.run_batch(batch_input, batch_output or default_output_path(batch_input),
+                                       concurrency, task_timeout))
+        sys.exit(0 if ok else 1)
+
+    if profile_startup and not prompt:
+        asyncio.run(cli.profile_startup())
+        click.echo(startup.get_profiler().report(), err=True)
+        return
+
+    startup.mark("first output")
     if prompt:
         result = asyncio.run(cli.run_single(prompt))
+        if profile_startup:
+            click.echo(startup.get_profiler().report(), err=True)
         if result is None:
             sys.exit(1)
-    print('done')   
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,88 @@
 from __future__ import annotations
 import abc
-from ast import Return
-from dataclasses import Field, dataclass, field
+import asyncio
+import functools
+import os
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Coroutine, TypeVar
 from pydantic import BaseModel, ValidationError
 from enum import Enum
-from pydantic.json_schema import model_json_schema
-from regex import F
-from streamlit import success
+
+
+T = TypeVar("T")
+
+DEFAULT_IO_WORKERS = int(os.environ.get("CODY_TOOL_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+
+_executor : ThreadPoolExecutor | None = None
+_executor_workers = DEFAULT_IO_WORKERS
+_executor_lock = threading.Lock()
+
+
+def configure_executor(max_workers : int) -> None:
+    global _executor, _executor_workers
+    with _executor_lock:
+        old, _executor = _executor, None
+        _executor_workers = max(1, max_workers)
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_executor_workers,
+                                               thread_name_prefix="tool-io")
+    return _executor
+
+
+async def run_blocking(func : Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+@types.coroutine
+def _track_loop_blocking(coro : Coroutine, record : Callable[[float], None]):
+    # Drive the coroutine step by step and time every send()/throw(): that is
+    # exactly the time it holds the event loop without yielding.
+    value, error = None, None
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                if error is None:
+                    future = coro.send(value)
+                else:
+                    future = coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                record(time.perf_counter() - started)
+            value, error = None, None
+            try:
+                value = yield future
+            except BaseException as e:
+                error = e
+    finally:
+        coro.close()
+
+
+@dataclass
+class ToolStats:
+    calls : int = 0
+    loop_blocking_seconds : float = 0.0
+    max_loop_blocking_seconds : float = 0.0
+    offloaded_seconds : float = 0.0
+    
+    def record_loop_blocking(self, seconds : float) -> None:
+        self.loop_blocking_seconds += seconds
+        self.max_loop_blocking_seconds = max(self.max_loop_blocking_seconds, seconds)
 
 
 @dataclass
@@ -32,6 +106,14 @@ class ToolResults:
     def success_results(cls,output : str, **kwargs):
         return cls(success=True, output=output, **kwargs)
 
+    def to_model_output(self) -> str:
+        if self.success:
+            return self.output or "(no output)"
+        
+        if self.output:
+            return f"Error : {self.error}\n\n{self.output}"
+        return f"Error : {self.error}"
+
 @dataclass
 class ToolConfirmation:
     tool_name : str
@@ -55,7 +137,7 @@ class Tool(abc.ABC):
     
     def __init__(self):
         super().__init__()
-        pass
+        self.stats = ToolStats()
     
     @property
     def schema(self) -> dict[str, Any] | type['BaseModel']:    
@@ -64,6 +146,17 @@ class Tool(abc.ABC):
     @abc.abstractmethod
     async def execute(self, invocation : ToolInvocation) -> ToolResults:
         pass
+    
+    async def invoke(self, invocation : ToolInvocation) -> ToolResults:
+        self.stats.calls += 1
+        return await _track_loop_blocking(self.execute(invocation), self.stats.record_loop_blocking)
+    
+    async def run_blocking(self, func : Callable[..., T], *args, **kwargs) -> T:
+        started = time.perf_counter()
+        try:
+            return await run_blocking(func, *args, **kwargs)
+        finally:
+            self.stats.offloaded_seconds += time.perf_counter() - started
         
     
     def validate_params(self, params : dict[str, Any]):
@@ -100,9 +193,11 @@ class Tool(abc.ABC):
         
         schema = self.schema
         if isinstance(schema, type) and issubclass(schema, BaseModel):
+            from pydantic.json_schema import model_json_schema
 
             json_schema = model_json_schema(schema , mode='serialization')
             return { "name" : self.name,
+                      "description" : self.description,
                       "parameters" : {
                             "type" : "object",
                             "properties": json_schema.get('properties',{}),
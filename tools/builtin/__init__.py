@@ -1,12 +1,20 @@
+from tools.builtin.glob import GlobTool
+from tools.builtin.grep import GrepTool
+from tools.builtin.list_dir import ListDirTool
 from tools.builtin.read_file import ReadFileTool
+from tools.builtin.read_many_files import ReadManyFilesTool
 
 __all__ = [
     
-    'ReadFileTool'
+    'ReadFileTool',
+    'ReadManyFilesTool',
+    'GrepTool',
+    'GlobTool',
+    'ListDirTool',
 ]
 
 def get_all_builtin_tools() -> list[type]:
     
-    return [ ReadFileTool ]
+    return [ ReadFileTool, ReadManyFilesTool, GrepTool, GlobTool, ListDirTool ]
 
     
\ No newline at end of file
@@ -0,0 +1,52 @@
+from tools.base import Tool, ToolKind, ToolResults
+from pydantic import BaseModel, Field
+
+from utils.paths import resolve_path
+from utils.text import fit_tokens
+from utils.tree import snapshot_for
+
+
+
+class GlobParams(BaseModel):
+    
+    pattern : str = Field(..., description="Glob pattern matched against paths relative to `path`, e.g. '**/*.py' or 'src/*.ts'.")
+    path : str = Field(".", description="Directory to search from (relative to working directory or absolute). Defaults to the working directory.")
+    
+    
+class GlobTool(Tool):
+    
+    name = "glob"
+    description = (
+        "Find files by name pattern. Supports '*', '?', '[...]' and '**' for any number of directories. "
+        "Respects .gitignore. Returns matching paths, most recently modified first."
+    )
+    kind = ToolKind.READ
+    
+    schema = GlobParams
+    MAX_RESULTS = 1000
+    MAX_OUTPUT_TOKENS = 25000
+    
+    
+    async def execute(self, invocation):
+        params = GlobParams(**invocation.params)
+        root = resolve_path(invocation.cwd, params.path)
+        if not root.is_dir():
+            return ToolResults.error_results(f"Directory not found : {root}")
+        
+        snapshot, relative = snapshot_for(invocation.cwd, root)
+        matches = await self.run_blocking(snapshot.glob, params.pattern, relative)
+        if not matches:
+            return ToolResults.success_results(f"No files matched {params.pattern}", metadata= {"matches": 0})
+        
+        matches.sort(key=lambda match: match[1].st_mtime_ns, reverse=True)
+        limited = len(matches) > self.MAX_RESULTS
+        paths = [(snapshot.root / path).relative_to(root).as_posix() for path, _ in matches[:self.MAX_RESULTS]]
+        
+        fitted = fit_tokens("\n".join(paths), self.MAX_OUTPUT_TOKENS,
+                            suffix= f"\n..[truncated, {len(matches)} matches total ]")
+        output = fitted.text
+        if limited:
+            output += f"\n..[showing {self.MAX_RESULTS} of {len(matches)} matches ]"
+        return ToolResults.success_results(output,
+                                           truncated= fitted.truncated or limited,
+                                           metadata= {"matches": len(matches)})
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from tools.base import Tool, ToolKind, ToolResults, run_blocking
+from pydantic import BaseModel, Field
+
+from utils.ignore import glob_to_regex
+from utils.paths import resolve_path
+from utils.text import fit_tokens
+from utils.tree import WorkspaceSnapshot, snapshot_for
+from utils.trigram_index import TrigramIndex, file_trigrams
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+MAX_LINE_CHARS = 500
+
+
+def _search_chunk(root : str, relatives : list[str], pattern : str, flags : int,
+                  max_matches : int) -> list[tuple[str, int, str]]:
+    # runs in worker processes, so it only takes and returns plain data
+    regex = re.compile(pattern, flags)
+    matches = []
+    for relative in relatives:
+        try:
+            with open(os.path.join(root, relative), "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b"\x00" in data[:8192]:
+            continue
+        text = data.decode("utf-8", errors="replace")
+        if regex.search(text) is None:
+            continue
+        for lineno, line in enumerate(text.splitlines(), start=1):
+            if regex.search(line):
+                matches.append((relative, lineno, line[:MAX_LINE_CHARS]))
+                if len(matches) >= max_matches:
+                    return matches
+    return matches
+
+
+_process_pool : "ProcessPoolExecutor | None" = None
+_process_pool_lock = threading.Lock()
+_indexes : dict[Path, TrigramIndex] = {}
+# one index load/refresh per root at a time
+_index_locks : dict[Path, asyncio.Lock] = {}
+
+
+def get_process_pool() -> "ProcessPoolExecutor":
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # multiprocessing is only loaded by the first large search
+                from concurrent.futures import ProcessPoolExecutor
+                _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _process_pool
+
+
+class GrepParams(BaseModel):
+    
+    pattern : str = Field(..., description="Regular expression to search for (Python `re` syntax).")
+    path : str = Field(".", description="Directory or file to search in (relative to working directory or absolute). Defaults to the working directory.")
+    include : str | None = Field(None, description="Only search files whose name or relative path matches this glob, e.g. '*.py' or 'src/**/*.ts'.")
+    ignore_case : bool = Field(False, description="Case-insensitive search.")
+    max_matches : int = Field(200, ge=1, le=2000, description="Maximum number of matching lines to return.")
+    
+    
+class GrepTool(Tool):
+    
+    name = "grep"
+    description = (
+        "Search file contents in the workspace with a regular expression. Respects .gitignore. "
+        "Returns matching lines as path:line:content."
+    )
+    kind = ToolKind.READ
+    
+    schema = GrepParams
+    MAX_OUTPUT_TOKENS = 25000
+    # below this many files a single thread beats starting worker processes
+    PARALLEL_MIN_FILES = 200
+    CHUNK_FILES = 256
+    # the trigram index only pays off on large trees; CODY_GREP_INDEX=0 turns it off
+    INDEX_MIN_FILES = 5000
+    USE_INDEX = os.environ.get("CODY_GREP_INDEX", "1") != "0"
+    
+    
+    async def execute(self, invocation):
+        params = GrepParams(**invocation.params)
+        flags = re.IGNORECASE if params.ignore_case else 0
+        try:
+            re.compile(params.pattern, flags)
+        except re.error as e:
+            return ToolResults.error_results(f"Invalid regular expression : {e}")
+        
+        root = resolve_path(invocation.cwd, params.path)
+        if not root.exists():
+            return ToolResults.error_results(f"Path not found : {root}")
+        
+        if root.is_file():
+            snapshot = None
+            files = [root.name]
+            root = root.parent
+        else:
+            snapshot, relative = snapshot_for(invocation.cwd, root)
+            prefix = f"{relative}/" if relative else ""
+            listing = await self.run_blocking(lambda: list(snapshot.iter_files(relative)))
+            root = snapshot.root
+            # same glob semantics as the glob tool and .gitignore: '*' stays
+            # within a directory, a pattern without '/' matches at any depth
+            include = re.compile(glob_to_regex(params.include)) if params.include else None
+            files = [path for path, _ in listing if include is None or include.match(path[len(prefix):])]
+            
+        searched = len(files)
+        if snapshot is not None and self.USE_INDEX and len(files) >= self.INDEX_MIN_FILES:
+            candidates = await self._index_candidates(snapshot, params.pattern)
+            if candidates is not None:
+                files = [relative for relative in files if relative in candidates]
+                
+        matches = await self._search(root, files, params.pattern, flags, params.max_matches)
+        matches.sort(key=lambda match: (match[0], match[1]))
+        
+        if not matches:
+            return ToolResults.success_results(f"No matches found ({searched} files searched).",
+                                               metadata= {"matches": 0, "files_searched": searched})
+            
+        limited = len(matches) > params.max_matches
+        matches = matches[:params.max_matches]
+        lines = []
+        for relative, lineno, line in matches:
+            display = os.path.relpath(root / relative, invocation.cwd)
+            lines.append(f"{display}:{lineno}:{line}")
+            
+        fitted = fit_tokens("\n".join(lines), self.MAX_OUTPUT_TOKENS,
+                            suffix= f"\n..[truncated, {len(matches)} matches total ]")
+        file_count = len({match[0] for match in matches})
+        header = f"Found {len(matches)}{'+' if limited else ''} matches in {file_count} files\n\n"
+        return ToolResults.success_results(header + fitted.text,
+                                           truncated= fitted.truncated or limited,
+                                           metadata= {"matches": len(matches),
+                                                      "files_searched": searched,
+                                                      "files_scanned": len(files)})
+        
+    async def _search(self, root : Path, files : list[str], pattern : str, flags : int,
+                      max_matches : int) -> list[tuple[str, int, str]]:
+        if len(files) < self.PARALLEL_MIN_FILES:
+            return await self.run_blocking(_search_chunk, str(root), files, pattern, flags, max_matches + 1)
+        
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        chunks = [files[i:i + self.CHUNK_FILES] for i in range(0, len(files), self.CHUNK_FILES)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _search_chunk, str(root), chunk, pattern, flags, max_matches + 1)
+            for chunk in chunks
+        ))
+        return [match for result in results for match in result]
+    
+    async def _index_candidates(self, snapshot : WorkspaceSnapshot, pattern : str) -> set[str] | None:
+        root = snapshot.root
+        async with _index_locks.setdefault(root, asyncio.Lock()):
+            index = await self._refresh_index(snapshot)
+        return await self.run_blocking(index.candidates, pattern)
+    
+    async def _refresh_index(self, snapshot : WorkspaceSnapshot) -> TrigramIndex:
+        root = snapshot.root
+        index = _indexes.get(root)
+        if index is None:
+            index = await self.run_blocking(TrigramIndex.load, root)
+            _indexes[root] = index
+            
+        # every file is re-stat'ed so an edit made a moment ago is never
+        # filtered out by stale trigrams; the index itself is only compared
+        # when the snapshot saw a change
+        version = await self.run_blocking(snapshot.restat)
+        if version != index.snapshot_version:
+            listing = await self.run_blocking(lambda: list(snapshot.iter_files()))
+            changed, removed = await self.run_blocking(index.stale, listing)
+        else:
+            changed, removed = [], []
+        if changed:
+            stats = dict(listing)
+            pool = get_process_pool()
+            # one segment per batch keeps a first build of a large tree from
+            # holding every file's trigrams at once
+            for start in range(0, len(changed), TrigramIndex.SEGMENT_DOCS):
+                batch = changed[start:start + TrigramIndex.SEGMENT_DOCS]
+                paths = [str(root / relative) for relative in batch]
+                trigrams = await run_blocking(lambda: list(pool.map(file_trigrams, paths, chunksize=64)))
+                await self.run_blocking(index.update,
+                                        {relative: (stats[relative].st_mtime_ns, stats[relative].st_size, raw)
+                                         for relative, raw in zip(batch, trigrams)},
+                                        removed if start == 0 else [])
+        elif removed:
+            await self.run_blocking(index.update, {}, removed)
+        index.snapshot_version = version
+        return index
@@ -0,0 +1,62 @@
+from tools.base import Tool, ToolKind, ToolResults
+from pydantic import BaseModel, Field
+
+from utils.paths import resolve_path
+from utils.tree import in_workspace, list_directory, snapshot_for
+
+
+
+class ListDirParams(BaseModel):
+    
+    path : str = Field(".", description="Directory to list (relative to working directory or absolute). Defaults to the working directory.")
+    
+    
+class ListDirTool(Tool):
+    
+    name = "list_dir"
+    description = (
+        "List the files and subdirectories of a directory. Respects .gitignore. "
+        "Directories are shown first with a trailing '/'."
+    )
+    kind = ToolKind.READ
+    
+    schema = ListDirParams
+    MAX_ENTRIES = 1000
+    
+    
+    async def execute(self, invocation):
+        params = ListDirParams(**invocation.params)
+        root = resolve_path(invocation.cwd, params.path)
+        if not root.is_dir():
+            return ToolResults.error_results(f"Directory not found : {root}")
+        
+        if in_workspace(invocation.cwd, root):
+            snapshot, relative = snapshot_for(invocation.cwd, root)
+            node = await self.run_blocking(snapshot.find, relative)
+        else:
+            node = await self.run_blocking(list_directory, root)
+        if node is None:
+            return ToolResults.error_results(f"Directory is ignored or not found : {root}")
+        
+        entries = [f"{name}/" for name in sorted(node.dirs)]
+        entries += [f"{name} ({_format_size(node.files[name].st_size)})" for name in sorted(node.files)]
+        if not entries:
+            return ToolResults.success_results("Directory is empty !", metadata= {"entries": 0})
+        
+        total = len(entries)
+        output = "\n".join(entries[:self.MAX_ENTRIES])
+        if total > self.MAX_ENTRIES:
+            output += f"\n..[showing {self.MAX_ENTRIES} of {total} entries ]"
+        return ToolResults.success_results(output,
+                                           truncated= total > self.MAX_ENTRIES,
+                                           metadata= {"entries": total,
+                                                      "dirs": len(node.dirs),
+                                                      "files": len(node.files)})
+
+
+def _format_size(size : int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
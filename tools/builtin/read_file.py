@@ -1,14 +1,33 @@
-
-from importlib import metadata
+from pathlib import Path
 
 from tools.base import Tool, ToolKind, ToolResults
 from pydantic import BaseModel, Field
 
-from utils.paths import is_binary_file, resolve_path
-from utils.text import count_tokens, truncate_text
+from utils.file_cache import get_file_cache
+from utils.line_index import LineIndex
+from utils.paths import resolve_path
+from utils.text import TruncateResult, fit_tokens
 
 
 
+def render_lines(index : LineIndex, start_idx : int, end_idx : int, max_tokens : int) -> TruncateResult:
+    content = index.read_text(start_idx, end_idx)
+    
+    selected_lines = content.split("\n")
+    if content.endswith("\n"):
+        selected_lines.pop()
+    formatted_lines = []
+    for i, line in enumerate(selected_lines, start=start_idx+1):
+        line = line.removesuffix("\r")
+        formatted_lines.append(f"{i:6}|{line}")
+    
+    return fit_tokens(
+        "\n".join(formatted_lines),
+        max_tokens,
+        suffix= f"\n..[truncated {index.line_count} total lines ]"
+    )
+
+
 class ReadFileParams(BaseModel):
     
     path : str = Field(
@@ -31,63 +50,59 @@ class ReadFileTool(Tool):
     kind = ToolKind.READ
     
     schema = ReadFileParams
-    MAX_FILE_SIZE = 1024 * 1024 * 10
+    MAX_FILE_SIZE = 1024 * 1024 * 1024
     MAX_OUTPUT_TOKENS = 25000
+    # without a limit only this many bytes are read; the rest would be cut
+    # by MAX_OUTPUT_TOKENS anyway
+    MAX_UNBOUNDED_READ_BYTES = 1024 * 1024
     
     
     async def execute(self, invocation):
         params = ReadFileParams(**invocation.params)
         path = resolve_path(invocation.cwd, params.path)
+        return await self.run_blocking(self._read, path, params)
+    
+    def _read(self, path : Path, params : ReadFileParams) -> ToolResults:
         if not path.exists():
             return ToolResults.error_results(f"File not found : {path}")
         
         if not path.is_file():
             return ToolResults.error_results('Path is not a file.')
         
-        file_size = path.stat().st_size
+        stat = path.stat()
+        file_size = stat.st_size
         if file_size > self.MAX_FILE_SIZE:
             return ToolResults.error_results(f"File too large ({file_size/ (1024*1024):.1f}MB)."
                                              f"Maximum is {self.MAX_FILE_SIZE/(1024*1024):.1f}MB.")
             
-        if is_binary_file(path):
-            return ToolResults.error_results(f"Cannot read binary file {path}."
-                                             "This tool only read text files.")        
-        
         try:
-            try:  
-                content = path.read_text(encoding='utf-8')
-            except UnicodeDecodeError:
-                content = path.read_text(encoding='latin-1')
+            index = get_file_cache().get_index(path, stat)
+            if index.is_binary:
+                return ToolResults.error_results(f"Cannot read binary file {path}."
+                                                 "This tool only read text files.")
             
-            lines = content.splitlines()
-            total_lines = len(lines)
+            total_lines = index.line_count
             
             if total_lines == 0:
                 return ToolResults.success_results("File is empty !", metadata= {"lines":0})
             
             start_idx = max(0,params.offset-1)
+            if start_idx >= total_lines:
+                return ToolResults.error_results(f"Offset {params.offset} is beyond the end of the file ({total_lines} lines).")
+            
             if params.limit is not None:
                 end_idx = min(start_idx+ params.limit, total_lines)
-                
             else:
-                end_idx = total_lines
+                end_idx = index.end_for_bytes(start_idx, self.MAX_UNBOUNDED_READ_BYTES)
                 
-            selected_lines = lines[start_idx : end_idx]
-            formatted_lines = []
-            for i, line in enumerate(selected_lines, start=1):
-                formatted_lines.append(f"{i:6}|{line}")
-            
-            output = "\n".join(formatted_lines)
-            tokens_count = count_tokens(output)
-            truncated = False
-            if tokens_count > self.MAX_OUTPUT_TOKENS:
-                output = truncate_text(
-                    output,
-                    self.MAX_OUTPUT_TOKENS,
-                    suffix= f"\n..[truncated {total_lines} total lines ]"
-                )        
-                
-                truncated = True
+            fitted = get_file_cache().get_view(
+                path, stat,
+                (self.name, start_idx, end_idx, self.MAX_OUTPUT_TOKENS),
+                lambda index: render_lines(index, start_idx, end_idx, self.MAX_OUTPUT_TOKENS),
+                size_of= lambda fitted: len(fitted.text),
+            )
+            output = fitted.text
+            truncated = fitted.truncated
                 
             metadata_lines = []
             if start_idx>0 or end_idx < total_lines:
@@ -110,4 +125,4 @@ class ReadFileTool(Tool):
             
         
         
-        
\ No newline at end of file
+        
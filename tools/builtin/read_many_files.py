@@ -0,0 +1,193 @@
+import asyncio
+import glob
+from dataclasses import dataclass
+from pathlib import Path
+
+from tools.base import Tool, ToolKind, ToolResults
+from tools.builtin.read_file import ReadFileTool, render_lines
+from pydantic import BaseModel, Field
+
+from utils.file_cache import get_file_cache
+from utils.paths import resolve_path
+from utils.text import TruncateResult
+from utils.tree import snapshot_for
+
+
+
+class FileSpec(BaseModel):
+    
+    path : str = Field(
+        ...,
+        description="File path or glob pattern (e.g. 'src/**/*.py'), relative to working directory or absolute"
+    )
+    offset : int = Field(1,ge=1, description="Line number to start reading from (1-based). Defaults to 1.")
+    limit : int | None = Field(None, ge=1, description="Maximum number of lines to read from each matched file.")
+    
+    
+class ReadManyFilesParams(BaseModel):
+    
+    files : list[FileSpec] = Field(
+        ...,
+        min_length=1,
+        description="Files to read. Globs are expanded; offset/limit apply to every file they match."
+    )
+
+
+@dataclass
+class _LoadedFile:
+    path : Path
+    start_idx : int = 0
+    end_idx : int = 0
+    total_lines : int = 0
+    rendered : TruncateResult | None = None
+    error : str | None = None
+    
+    @property
+    def header(self) -> str:
+        if self.error:
+            return f"==> {self.path} <=="
+        return f"==> {self.path} (lines {self.start_idx+1}-{self.end_idx} of {self.total_lines}) <=="
+
+
+class ReadManyFilesTool(Tool):
+    
+    name = "read_many_files"
+    description = (
+        "Read several text files in one call. Accepts paths or glob patterns with optional per-file "
+        "offset and limit, and returns every file with line numbers under one shared output budget. "
+        "Prefer this over multiple read_file calls when you already know which files you need."
+    )
+    kind = ToolKind.READ
+    
+    schema = ReadManyFilesParams
+    MAX_FILES = 50
+    MAX_OUTPUT_TOKENS = ReadFileTool.MAX_OUTPUT_TOKENS
+    # reserved per file for its header line
+    HEADER_TOKENS = 32
+    
+    
+    async def execute(self, invocation):
+        params = ReadManyFilesParams(**invocation.params)
+        
+        targets : list[tuple[Path, FileSpec]] = []
+        seen : set[Path] = set()
+        expanded = await self.run_blocking(lambda: [self._expand(invocation.cwd, spec.path)
+                                                    for spec in params.files])
+        for spec, paths in zip(params.files, expanded):
+            for path in paths:
+                if path not in seen:
+                    seen.add(path)
+                    targets.append((path, spec))
+                    
+        if not targets:
+            return ToolResults.error_results("No files matched the given paths.")
+        
+        skipped = max(0, len(targets) - self.MAX_FILES)
+        targets = targets[:self.MAX_FILES]
+        
+        loaded = await asyncio.gather(*(self.run_blocking(self._load, path, spec) for path, spec in targets))
+        budgets = self._allocate(loaded)
+        await asyncio.gather(*(self.run_blocking(self._fit, item, budget)
+                               for item, budget in zip(loaded, budgets)
+                               if item.rendered is not None and item.rendered.token_count > budget))
+        
+        sections = []
+        for item in loaded:
+            if item.error:
+                sections.append(f"{item.header}\n[error : {item.error}]")
+            else:
+                sections.append(f"{item.header}\n{item.rendered.text}")
+        if skipped:
+            sections.append(f"[{skipped} more matching files not shown; maximum is {self.MAX_FILES}]")
+            
+        read = [item for item in loaded if not item.error]
+        if not read:
+            return ToolResults.error_results("Failed to read all requested files.",
+                                             output="\n\n".join(sections))
+            
+        return ToolResults.success_results(output="\n\n".join(sections),
+                                           truncated= any(item.rendered.truncated for item in read) or bool(skipped),
+                                           metadata= {"files": [str(item.path) for item in read],
+                                                      "errors": {str(item.path): item.error for item in loaded if item.error}})
+        
+    def _expand(self, cwd : Path, pattern : str) -> list[Path]:
+        if not glob.has_magic(pattern):
+            return [resolve_path(cwd, pattern)]
+        
+        # globs go through the workspace snapshot, so ignored trees such as
+        # .git or node_modules are never walked
+        parts = Path(pattern).parts
+        split = next(i for i, part in enumerate(parts) if glob.has_magic(part))
+        base = resolve_path(cwd, str(Path(*parts[:split])) if split else ".")
+        if not base.is_dir():
+            return []
+        snapshot, relative = snapshot_for(cwd, base)
+        return sorted(snapshot.root / path for path, _ in snapshot.glob("/".join(parts[split:]), relative))
+    
+    def _load(self, path : Path, spec : FileSpec) -> _LoadedFile:
+        item = _LoadedFile(path=path)
+        try:
+            if not path.is_file():
+                item.error = "File not found" if not path.exists() else "Path is not a file."
+                return item
+            
+            stat = path.stat()
+            if stat.st_size > ReadFileTool.MAX_FILE_SIZE:
+                item.error = f"File too large ({stat.st_size/ (1024*1024):.1f}MB)."
+                return item
+            
+            index = get_file_cache().get_index(path, stat)
+            if index.is_binary:
+                item.error = "Cannot read binary file."
+                return item
+            
+            item.total_lines = index.line_count
+            item.start_idx = max(0, spec.offset-1)
+            if item.total_lines == 0:
+                item.rendered = TruncateResult("File is empty !", 0)
+                return item
+            if item.start_idx >= item.total_lines:
+                item.error = f"Offset {spec.offset} is beyond the end of the file ({item.total_lines} lines)."
+                return item
+            
+            if spec.limit is not None:
+                item.end_idx = min(item.start_idx + spec.limit, item.total_lines)
+            else:
+                item.end_idx = index.end_for_bytes(item.start_idx, ReadFileTool.MAX_UNBOUNDED_READ_BYTES)
+                
+            # same cache key as read_file, so either tool can reuse the other's work
+            item.rendered = get_file_cache().get_view(
+                path, stat,
+                (ReadFileTool.name, item.start_idx, item.end_idx, ReadFileTool.MAX_OUTPUT_TOKENS),
+                lambda index: render_lines(index, item.start_idx, item.end_idx, ReadFileTool.MAX_OUTPUT_TOKENS),
+                size_of= lambda fitted: len(fitted.text),
+            )
+        except Exception as e:
+            item.error = f"Failed to read the file :{str(e)}"
+        return item
+    
+    def _allocate(self, loaded : list[_LoadedFile]) -> list[int]:
+        # water-filling: small files get everything they need, what is left
+        # is split evenly between the files that still want more
+        budget = max(0, self.MAX_OUTPUT_TOKENS - self.HEADER_TOKENS * len(loaded))
+        needs = [item.rendered.token_count if item.rendered else 0 for item in loaded]
+        budgets = [0] * len(loaded)
+        
+        remaining = budget
+        pending = sorted(range(len(loaded)), key=lambda i: needs[i])
+        while pending:
+            share = remaining // len(pending)
+            i = pending.pop(0)
+            budgets[i] = min(needs[i], share)
+            remaining -= budgets[i]
+        return budgets
+    
+    def _fit(self, item : _LoadedFile, budget : int) -> None:
+        try:
+            stat = item.path.stat()
+            index = get_file_cache().get_index(item.path, stat)
+            item.rendered = render_lines(index, item.start_idx, item.end_idx, budget)
+        except Exception as e:
+            # the file changed or vanished since it was loaded
+            item.rendered = None
+            item.error = f"Failed to read the file :{str(e)}"
@@ -1,10 +1,10 @@
-from importlib import metadata
 import logging
 from pathlib import Path
 from typing import Any
 
-from tools.base import Tool, ToolInvocation, ToolResults
+from tools.base import Tool, ToolInvocation, ToolResults, ToolStats
 from tools.builtin import ReadFileTool, get_all_builtin_tools
+from utils.tracing import NOOP_SPAN, Span
 logger = logging.getLogger(__name__)
 
 class ToolRegistry:
@@ -25,10 +25,10 @@ class ToolRegistry:
             return True
         return None
     
-    def get(self, name : str ) -> Tool:
+    def get(self, name : str ) -> Tool | None:
         if name in self._tools:
             return self._tools[name]
-        return False
+        return None
     
     def get_tools(self):
         
@@ -37,32 +37,52 @@ class ToolRegistry:
             tools.append(tool)
         return tools
     
+    def get_stats(self) -> dict[str, ToolStats]:
+        return {name: tool.stats for name, tool in self._tools.items()}
+    
     def get_schemas(self):
         
         return [tool.to_openai_schema() for tool in self.get_tools()]
     
     
-    async def invoke(self, name : str, params : dict[str, Any], cwd : Path| None):
+    async def invoke(self, name : str, params : dict[str, Any], cwd : Path| None,
+                     span : Span = NOOP_SPAN) -> ToolResults:
         
         tool = self.get(name)
         if tool is None:
+            span.set_error("unknown tool")
             return ToolResults.error_results(f"Unknown Tool :{name}",
                                              metadata = {"tool_name": name})
-        validation_errors = tool.validate_params(params)
+        span.set(**{"tool.kind": tool.kind.value})
+        with span.child("tool.validate") as validate_span:
+            validation_errors = tool.validate_params(params)
+            if validation_errors:
+                validate_span.set_error("; ".join(validation_errors))
         if validation_errors:
+            span.set_error("invalid parameters")
             return ToolResults.error_results(
                 error=f"Invalid parameters : {'; '.join(validation_errors)}",
                 metadata = {'tool_name':name, "validation_errors": validation_errors}
             )
         invocation = ToolInvocation(params=params, cwd = cwd)
         try:
-            await tool.execute(invocation)
+            with span.child("tool.execute"):
+                result = await tool.invoke(invocation)
         except Exception as e:
             logger.exception(f"Tool {name} raised unexpected error !")
+            span.set_error(str(e))
             return ToolResults.error_results(
                 f"Internal error : {str(e)}",
                 metadata = {"tool_name": name}
             )
+        # truncation happens inside the tools; record whether it kicked in
+        # and how much output survived it
+        span.set(**{"tool.success": result.success,
+                    "tool.truncated": result.truncated,
+                    "tool.output_chars": len(result.output or "")})
+        if not result.success:
+            span.set_error(result.error or "tool failed")
+        return result
             
             
 def create_default_registry() -> ToolRegistry:
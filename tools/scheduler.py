@@ -0,0 +1,71 @@
+from __future__ import annotations
+import asyncio
+import logging
+from pathlib import Path
+
+from client.response import ToolCall
+from tools.base import ToolKind, ToolResults
+from tools.registry import ToolRegistry
+from utils.tracing import NOOP_SPAN, Span
+
+logger = logging.getLogger(__name__)
+
+
+class ToolScheduler:
+    
+    # READ tools have no side effects, so a run of consecutive READ calls can
+    # execute concurrently. Every other kind acts as a barrier and runs alone,
+    # in the order the model emitted it.
+    MAX_CONCURRENCY = 8
+    
+    def __init__(self, registry : ToolRegistry, cwd : Path, max_concurrency : int | None = None):
+        self.registry = registry
+        self.cwd = cwd
+        self._semaphore = asyncio.Semaphore(max_concurrency or self.MAX_CONCURRENCY)
+        
+    def is_parallel_safe(self, call : ToolCall) -> bool:
+        tool = self.registry.get(call.name)
+        return tool is not None and tool.kind == ToolKind.READ
+    
+    async def _invoke(self, call : ToolCall, parent : Span = NOOP_SPAN) -> ToolResults:
+        with parent.child("tool.invoke", **{"gen_ai.tool.name": call.name,
+                                            "gen_ai.tool.call.id": call.call_id}) as span:
+            async with self._semaphore:
+                span.set(**{"tool.queue_ms": span.elapsed_ms()})
+                return await self.registry.invoke(call.name, call.arguments, self.cwd, span)
+    
+    def start(self, call : ToolCall, parent : Span = NOOP_SPAN) -> asyncio.Task[ToolResults]:
+        return asyncio.create_task(self._invoke(call, parent))
+    
+    async def _invoke_batch(self, calls : list[ToolCall],
+                            started : dict[str, asyncio.Task[ToolResults]],
+                            parent : Span = NOOP_SPAN) -> list[ToolResults]:
+        awaitables = [started.pop(call.call_id) if call.call_id in started else self._invoke(call, parent)
+                      for call in calls]
+        if len(awaitables) == 1:
+            return [await awaitables[0]]
+        return list(await asyncio.gather(*awaitables))
+    
+    async def run(self, calls : list[ToolCall],
+                  started : dict[str, asyncio.Task[ToolResults]] | None = None,
+                  parent : Span = NOOP_SPAN) -> list[ToolResults]:
+        # `started` holds READ calls the agent kicked off while the model was
+        # still streaming; they are awaited in place instead of re-invoked.
+        started = dict(started or {})
+        results : list[ToolResults] = []
+        batch : list[ToolCall] = []
+        
+        for call in calls:
+            if self.is_parallel_safe(call):
+                batch.append(call)
+                continue
+            
+            if batch:
+                results.extend(await self._invoke_batch(batch, started, parent))
+                batch = []
+            results.extend(await self._invoke_batch([call], started, parent))
+            
+        if batch:
+            results.extend(await self._invoke_batch(batch, started, parent))
+            
+        return results
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Optional
+
+from rich.console import Console
+from rich.live import Live
+
+DEFAULT_FPS = 30
+
+
+class StreamRenderer:
+    # Coalesces streamed deltas into frames: text is buffered and written at
+    # most `fps` times a second, or right away when a line completes, so the
+    # terminal sees one render and one write per frame instead of per token.
+
+    def __init__(self, console : Console, fps : int = DEFAULT_FPS):
+        self.console = console
+        self.frame_interval = 1.0 / max(1, fps)
+        self._buffer : list[str] = []
+        self._last_flush = 0.0
+        self._scheduled : Optional[asyncio.TimerHandle] = None
+
+    def write(self, delta : str) -> None:
+        if not delta:
+            return
+        self._buffer.append(delta)
+        now = time.monotonic()
+        if "\n" in delta or now - self._last_flush >= self.frame_interval:
+            self.flush()
+        else:
+            self._schedule(self.frame_interval - (now - self._last_flush))
+
+    def _schedule(self, delay : float) -> None:
+        # a stalled stream still gets its partial line on screen
+        if self._scheduled is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._scheduled = loop.call_later(delay, self.flush)
+
+    def flush(self) -> None:
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._render(text)
+
+    def _render(self, text : str) -> None:
+        self.console.out(text, end="", highlight=False)
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MarkdownStreamRenderer(StreamRenderer):
+    # Renders the answer as Markdown. Finished blocks (up to the last blank
+    # line outside a code fence) are printed once and scroll away; only the
+    # trailing block lives in a rich.live.Live region and is re-rendered on
+    # each frame, so the cost of a frame does not grow with the answer.
+
+    def __init__(self, console : Console, fps : int = DEFAULT_FPS):
+        super().__init__(console, fps)
+        self._tail = ""
+        self._live = Live(console=console, auto_refresh=False, vertical_overflow="visible")
+        self._live.start()
+
+    @staticmethod
+    def _markdown(text : str):
+        # markdown-it is only loaded when --markdown is used
+        from rich.markdown import Markdown
+        return Markdown(text)
+
+    def write(self, delta : str) -> None:
+        # newlines do not force a frame here: a Live refresh redraws the
+        # whole trailing block
+        if not delta:
+            return
+        self._buffer.append(delta)
+        now = time.monotonic()
+        if now - self._last_flush >= self.frame_interval:
+            self.flush()
+        else:
+            self._schedule(self.frame_interval - (now - self._last_flush))
+
+    def _render(self, text : str) -> None:
+        self._tail += text
+        split = self._block_boundary(self._tail)
+        if split:
+            finished, self._tail = self._tail[:split], self._tail[split:]
+            # printed above the live region, never redrawn again
+            self._live.console.print(self._markdown(finished))
+        self._live.update(self._markdown(self._tail), refresh=True)
+
+    @staticmethod
+    def _block_boundary(text : str) -> int:
+        # offset just past the last blank line that is not inside a ``` fence
+        boundary, in_fence, offset = 0, False, 0
+        for line in text.splitlines(keepends=True):
+            offset += len(line)
+            stripped = line.strip()
+            if stripped.startswith("```") or stripped.startswith("~~~"):
+                in_fence = not in_fence
+            elif not stripped and not in_fence and line.endswith("\n") and offset < len(text):
+                boundary = offset
+        return boundary
+
+    def close(self) -> None:
+        super().close()
+        self._live.update(self._markdown(self._tail), refresh=True)
+        self._live.stop()
+        self._tail = ""
@@ -3,7 +3,9 @@ from rich.theme import Theme
 from rich.rule import Rule
 from rich.text import Text
 
-from typing import Optional
+from typing import Any, Optional
+
+from ui.renderer import DEFAULT_FPS, MarkdownStreamRenderer, StreamRenderer
 
 AGENT_THEME = Theme(
     {
@@ -44,21 +46,52 @@ def get_console() -> Console:
 
 class TUI:
 
-    def __init__(self, console : Optional[Console] = None):
+    def __init__(self, console : Optional[Console] = None, markdown : bool = False, fps : int = DEFAULT_FPS):
         
         self.console = console or get_console()
-        self._assistant_stream_open = False
+        self.markdown = markdown
+        self.fps = fps
+        self._renderer : Optional[StreamRenderer] = None
 
     def begin_assistant(self) -> None:
         self.console.print()
         self.console.print(Rule(Text("Assistant",style="assistant")))
-        self._assistant_stream_open = True
+        renderer = MarkdownStreamRenderer if self.markdown else StreamRenderer
+        self._renderer = renderer(self.console, fps=self.fps)
 
 
     def end_assistant(self) -> None:
-        if self._assistant_stream_open:
+        if self._renderer is not None:
+            self._renderer.close()
             self.console.print()
-        self._assistant_stream_open = False
+        self._renderer = None
     
     def stream_assistant_delta(self,content : str) -> None:
-        self.console.print(content, end= "", markup= False)
+        if self._renderer is None:
+            self.begin_assistant()
+        self._renderer.write(content)
+
+    def tool_call_start(self, name : str, arguments : dict[str, Any], kind : Optional[str] = None) -> None:
+        style = f"tool.{kind}" if kind else "tool"
+        args = ", ".join(f"{key}={value!r}" for key, value in arguments.items())
+        self.console.print()
+        self.console.print(Text.assemble(("> ", "muted"), (name, style), (f"({args})", "muted")))
+
+    def budget_notice(self, message : str, hard : bool) -> None:
+        self.console.print()
+        self.console.print(Text(message, style="error" if hard else "warning"))
+
+    def usage_summary(self, summary : dict[str, Any]) -> None:
+        usage = summary.get("usage") or {}
+        if not usage.get("total_tokens"):
+            return
+        self.console.print(Text(f"{usage['prompt_tokens']} in / {usage['completion_tokens']} out tokens"
+                                f" ({usage.get('cached_tokens', 0)} cached), ${summary.get('cost_usd', 0):.4f},"
+                                f" {summary.get('elapsed_seconds', 0):.1f}s", style="muted"))
+
+    def tool_call_complete(self, name : str, success : bool, output : str, error : Optional[str] = None) -> None:
+        if success:
+            lines = output.count("\n") + 1 if output else 0
+            self.console.print(Text(f"  {name} ok ({lines} lines)", style="success"))
+        else:
+            self.console.print(Text(f"  {name} failed : {error}", style="error"))
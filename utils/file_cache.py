@@ -0,0 +1,176 @@
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Hashable, TypeVar
+
+from utils.line_index import LineIndex
+
+T = TypeVar("T")
+
+FileKey = tuple[str, int, int, int, int]
+
+
+@dataclass
+class CacheStats:
+    # one per logical read (get_view); index lookups are counted apart so
+    # a read that needs both is not counted twice
+    hits : int = 0
+    misses : int = 0
+    index_hits : int = 0
+    index_misses : int = 0
+    evictions : int = 0
+    entries : int = 0
+    bytes : int = 0
+    
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _CachedFile:
+    index : LineIndex
+    # derived views (formatted ranges, token counts, ...) keyed by the tool
+    # that produced them
+    views : dict[Hashable, tuple[Any, int]] = field(default_factory=dict)
+    size : int = 0
+
+
+class FileCache:
+    
+    DEFAULT_MAX_BYTES = int(os.environ.get("CODY_FILE_CACHE_BYTES", 128 * 1024 * 1024))
+    
+    def __init__(self, max_bytes : int | None = None):
+        self.max_bytes = max_bytes or self.DEFAULT_MAX_BYTES
+        self._entries : OrderedDict[FileKey, _CachedFile] = OrderedDict()
+        self._keys_by_path : dict[str, FileKey] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._index_hits = 0
+        self._index_misses = 0
+        self._evictions = 0
+        
+    @staticmethod
+    def key_for(path : Path, stat : os.stat_result) -> FileKey:
+        # inode/device catch files replaced by rename; size and mtime_ns
+        # catch in-place edits
+        return (str(path.resolve()), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(hits=self._hits, misses=self._misses,
+                              index_hits=self._index_hits, index_misses=self._index_misses,
+                              evictions=self._evictions,
+                              entries=len(self._entries), bytes=self._bytes)
+    
+    def get_index(self, path : Path, stat : os.stat_result | None = None) -> LineIndex:
+        stat = stat or path.stat()
+        key = self.key_for(path, stat)
+        with self._lock:
+            entry = self._entries.get(key)
+            self._record_index(key, entry is not None)
+        if entry is None:
+            entry = self._load(key, path, stat)
+        return entry.index
+        
+    def get_view(self, path : Path, stat : os.stat_result, view_key : Hashable,
+                 compute : Callable[[LineIndex], T], size_of : Callable[[T], int] = len) -> T:
+        key = self.key_for(path, stat)
+        with self._lock:
+            entry = self._entries.get(key)
+            cached = entry.views.get(view_key) if entry is not None else None
+            self._record(key, cached is not None)
+            if entry is None:
+                # the index is rebuilt here, which is a miss of its own
+                self._index_misses += 1
+        if cached is not None:
+            return cached[0]
+        
+        if entry is None:
+            entry = self._load(key, path, stat)
+        value = compute(entry.index)
+        size = size_of(value)
+        with self._lock:
+            if key in self._entries and view_key not in entry.views:
+                entry.views[view_key] = (value, size)
+                entry.size += size
+                self._bytes += size
+                self._evict()
+        return value
+    
+    def _load(self, key : FileKey, path : Path, stat : os.stat_result) -> _CachedFile:
+        # built outside the lock so concurrent reads of other files proceed
+        index = LineIndex.build(path, stat)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CachedFile(index=index)
+                self._insert(key, entry, index.memory_size)
+            return entry
+    
+    def invalidate(self, path : Path) -> None:
+        with self._lock:
+            key = self._keys_by_path.get(str(path.resolve()))
+            if key is not None:
+                self._remove(key)
+                
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self._bytes = 0
+    
+    def _record(self, key : FileKey, hit : bool) -> None:
+        if hit:
+            self._hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self._misses += 1
+            
+    def _record_index(self, key : FileKey, hit : bool) -> None:
+        if hit:
+            self._index_hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self._index_misses += 1
+    
+    def _insert(self, key : FileKey, entry : _CachedFile, size : int) -> None:
+        stale = self._keys_by_path.get(key[0])
+        if stale is not None and stale != key:
+            self._remove(stale)
+        entry.size = size
+        self._entries[key] = entry
+        self._keys_by_path[key[0]] = key
+        self._bytes += size
+        self._evict()
+        
+    def _remove(self, key : FileKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        if self._keys_by_path.get(key[0]) == key:
+            del self._keys_by_path[key[0]]
+        
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._evictions += 1
+
+
+_file_cache : FileCache | None = None
+
+
+def get_file_cache() -> FileCache:
+    global _file_cache
+    if _file_cache is None:
+        _file_cache = FileCache()
+    return _file_cache
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+# never worth searching, whether or not a .gitignore mentions them
+ALWAYS_IGNORED = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", ".mypy_cache", ".pytest_cache"}
+
+
+@dataclass
+class _Rule:
+    regex : re.Pattern
+    negated : bool
+    dir_only : bool
+
+
+def glob_to_regex(pattern : str, anchored : bool | None = None) -> str:
+    # gitignore-style glob -> regex over a '/' separated relative path; by
+    # default a pattern without a slash matches at any depth, like git does
+    if anchored is None:
+        anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.strip("/")
+    i, parts = 0, []
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            parts.append("/.*")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    return f"^{prefix}{''.join(parts)}$"
+
+
+class GitIgnore:
+    
+    def __init__(self, base : str = "", rules : list[_Rule] | None = None, parent : GitIgnore | None = None):
+        # base is the directory of the .gitignore, relative to the walk root
+        self.base = base
+        self.rules = rules or []
+        self.parent = parent
+        
+    @classmethod
+    def parse(cls, text : str, base : str = "", parent : GitIgnore | None = None) -> GitIgnore:
+        rules = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            rules.append(_Rule(re.compile(glob_to_regex(line)), negated, line.endswith("/")))
+        return cls(base, rules, parent)
+    
+    def child(self, directory : Path, relative : str) -> GitIgnore:
+        try:
+            text = (directory / ".gitignore").read_text(encoding="utf-8", errors="ignore")
+        except OSError:
+            return self
+        return GitIgnore.parse(text, relative, self)
+    
+    def is_ignored(self, relative : str, is_dir : bool) -> bool:
+        name = relative.rsplit("/", 1)[-1]
+        if name in ALWAYS_IGNORED:
+            return True
+        
+        ignore = self
+        while ignore is not None:
+            local = relative[len(ignore.base) + 1:] if ignore.base else relative
+            # last matching rule wins, deeper files override their parents
+            for rule in reversed(ignore.rules):
+                if rule.dir_only and not is_dir:
+                    continue
+                if rule.regex.match(local):
+                    return not rule.negated
+            ignore = ignore.parent
+        return False
+
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+
+from utils.paths import BINARY_SNIFF_BYTES, detect_encoding, is_binary_chunk
+
+
+class LineIndex:
+    
+    # files up to this size are kept in memory after the indexing pass, so a
+    # read never has to go back to disk
+    INLINE_BYTES = 256 * 1024
+    
+    def __init__(self, path : Path, size : int, mtime_ns : int, starts : array,
+                 encoding : str = "utf-8", is_binary : bool = False, data : bytes | None = None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.encoding = encoding
+        self.is_binary = is_binary
+        # byte offset at which every line starts
+        self._starts = starts
+        self._data = data
+        
+    @property
+    def line_count(self) -> int:
+        return len(self._starts)
+    
+    @property
+    def memory_size(self) -> int:
+        return self._starts.itemsize * len(self._starts) + (len(self._data) if self._data else 0)
+        
+    @classmethod
+    def build(cls, path : Path, stat : os.stat_result) -> LineIndex:
+        # one pass over the bytes sniffs for binary content, picks the
+        # encoding and records line offsets
+        size = stat.st_size
+        if not size:
+            return cls(path, size, stat.st_mtime_ns, array('Q'))
+        
+        with open(path, "rb") as f:
+            if size <= cls.INLINE_BYTES:
+                return cls._from_buffer(path, stat, f.read(), inline=True)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return cls._from_buffer(path, stat, mm, inline=False)
+            
+    @classmethod
+    def _from_buffer(cls, path : Path, stat : os.stat_result, buffer, inline : bool) -> LineIndex:
+        size = len(buffer)
+        if is_binary_chunk(buffer[:BINARY_SNIFF_BYTES]):
+            return cls(path, size, stat.st_mtime_ns, array('Q'), is_binary=True)
+        
+        starts = array('Q', [0])
+        find = buffer.find
+        position = find(b"\n")
+        while position != -1:
+            starts.append(position + 1)
+            position = find(b"\n", position + 1)
+        # a trailing newline terminates the last line, it does not start one
+        if starts[-1] == size:
+            starts.pop()
+            
+        return cls(path, size, stat.st_mtime_ns, starts,
+                   encoding=detect_encoding(buffer),
+                   data=buffer if inline else None)
+    
+    def matches(self, stat : os.stat_result) -> bool:
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+    
+    def byte_range(self, start : int, end : int) -> tuple[int, int]:
+        begin = self._starts[start] if start < len(self._starts) else self.size
+        stop = self._starts[end] if end < len(self._starts) else self.size
+        return begin, stop
+    
+    def end_for_bytes(self, start : int, max_bytes : int) -> int:
+        # last line boundary such that lines [start, end) fit in max_bytes,
+        # always including at least one line
+        begin = self._starts[start]
+        if begin + max_bytes >= self.size:
+            return len(self._starts)
+        end = bisect_right(self._starts, begin + max_bytes, lo=start) - 1
+        return min(max(end, start + 1), len(self._starts))
+    
+    def read_lines(self, start : int, end : int) -> bytes:
+        begin, stop = self.byte_range(start, end)
+        if stop <= begin:
+            return b""
+        if self._data is not None:
+            return self._data[begin:stop]
+        with open(self.path, "rb") as f:
+            f.seek(begin)
+            return f.read(stop - begin)
+        
+    def read_text(self, start : int, end : int) -> str:
+        encoding = self.encoding
+        if encoding == "utf-8-sig" and start > 0:
+            encoding = "utf-8"
+        return self.read_lines(start, end).decode(encoding)
+
@@ -1,5 +1,9 @@
+import codecs
 from pathlib import Path
 
+BINARY_SNIFF_BYTES = 8192
+DECODE_CHUNK_BYTES = 1024 * 1024
+
 
 def resolve_path(base:str | Path, path : str | Path):
     
@@ -10,10 +14,28 @@ def resolve_path(base:str | Path, path : str | Path):
     return Path(base).resolve()/ path
 
 
+def is_binary_chunk(chunk : bytes) -> bool:
+    return b"\x00" in chunk[:BINARY_SNIFF_BYTES]
+
+
+def detect_encoding(data : bytes) -> str:
+    # validate utf-8 chunk by chunk over the buffer we already hold instead of
+    # decoding the whole file, failing, and decoding it again as latin-1
+    if data[:3] == codecs.BOM_UTF8:
+        return "utf-8-sig"
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for start in range(0, len(data), DECODE_CHUNK_BYTES):
+            decoder.decode(data[start:start + DECODE_CHUNK_BYTES])
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
 def is_binary_file(path : str | Path) :
     try:
         with open(path,"rb") as f:
-            chunk = f.read(8192)
-            return f"\x00" in chunk
+            return is_binary_chunk(f.read(BINARY_SNIFF_BYTES))
     except (OSError, IOError) as e:
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,163 @@
+from __future__ import annotations
+# Startup profiling for `main.py --profile-startup`: per-module import times
+# (like `python -X importtime`) plus named milestones, all measured from the
+# moment main.py starts executing.
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+STARTED = time.perf_counter()
+
+
+@dataclass
+class ImportTiming:
+    name : str
+    self_seconds : float = 0.0
+    cumulative_seconds : float = 0.0
+
+
+@dataclass
+class _Frame:
+    name : str
+    started : float
+    children : float = 0.0
+
+
+class _TimingLoader:
+
+    def __init__(self, loader, profiler : StartupProfiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        try:
+            with self._profiler.timing(module.__name__):
+                self._loader.exec_module(module)
+        finally:
+            # hand back the real loader so nothing else sees the wrapper
+            module.__loader__ = self._loader
+            if module.__spec__ is not None:
+                module.__spec__.loader = self._loader
+
+    def __getattr__(self, name : str):
+        return getattr(self._loader, name)
+
+
+class StartupProfiler:
+    # a meta path finder (only find_spec is needed); importlib.abc itself
+    # costs tens of milliseconds to import
+
+    def __init__(self):
+        self.imports : dict[str, ImportTiming] = {}
+        self.milestones : dict[str, float] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # ask the real finders, then wrap whatever loader they pick
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimingLoader(spec.loader, self)
+                return spec
+        return None
+
+    def timing(self, name : str) -> _ImportScope:
+        return _ImportScope(self, name)
+
+    def _stack(self) -> list[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def mark(self, name : str) -> None:
+        # only the first occurrence of a milestone counts
+        self.milestones.setdefault(name, time.perf_counter() - STARTED)
+
+    def report(self, limit : int = 25) -> str:
+        lines = ["Startup milestones (since main.py started):"]
+        for name, seconds in sorted(self.milestones.items(), key=lambda item: item[1]):
+            lines.append(f"  {seconds * 1000:9.1f} ms  {name}")
+
+        timings = sorted(self.imports.values(), key=lambda t: t.cumulative_seconds, reverse=True)
+        total = sum(t.self_seconds for t in timings)
+        lines.append(f"Imports : {len(timings)} modules, {total * 1000:.1f} ms total")
+        lines.append(f"  {'self [ms]':>10} | {'cumulative':>10} | module")
+        for timing in timings[:limit]:
+            lines.append(f"  {timing.self_seconds * 1000:10.1f} | "
+                         f"{timing.cumulative_seconds * 1000:10.1f} | {timing.name}")
+        return "\n".join(lines)
+
+
+class _ImportScope:
+
+    def __init__(self, profiler : StartupProfiler, name : str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.profiler._stack().append(_Frame(self.name, time.perf_counter()))
+
+    def __exit__(self, *exc) -> None:
+        stack = self.profiler._stack()
+        frame = stack.pop()
+        elapsed = time.perf_counter() - frame.started
+        if stack:
+            stack[-1].children += elapsed
+        with self.profiler._lock:
+            timing = self.profiler.imports.setdefault(frame.name, ImportTiming(frame.name))
+            timing.self_seconds += elapsed - frame.children
+            timing.cumulative_seconds += elapsed
+
+
+_profiler : Optional[StartupProfiler] = None
+
+
+def enable_profiling() -> StartupProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler()
+        _profiler.install()
+    return _profiler
+
+
+def get_profiler() -> Optional[StartupProfiler]:
+    return _profiler
+
+
+def mark(name : str) -> None:
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+def preload(func, *args) -> threading.Thread:
+    # warm a cache off the main thread; whoever needs it first just waits
+    def run():
+        try:
+            func(*args)
+        except Exception as e:
+            logger.debug(f"Preloading {func} failed : {e}")
+
+    thread = threading.Thread(target=run, name=f"preload-{getattr(func, '__name__', 'task')}", daemon=True)
+    thread.start()
+    return thread
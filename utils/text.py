@@ -1,20 +1,47 @@
-import tiktoken
+from __future__ import annotations
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# model name -> resolved encoding; unknown models (e.g. openrouter ids) fall
+# back to DEFAULT_ENCODING once instead of on every call
+_encodings: dict[str, tiktoken.Encoding] = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model: str) -> tiktoken.Encoding:
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+
+    with _encodings_lock:
+        encoding = _encodings.get(model)
+        if encoding is None:
+            # imported here: tiktoken is slow to import and most of startup
+            # does not need it
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            _encodings[model] = encoding
+    return encoding
 
 
 def get_tokenizer(model: str):
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return encoding.encode
-    except Exception:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return encoding.encode
+    return get_encoding(model).encode
 
 
 def count_tokens(text: str, model: str = "gpt-4") -> int:
     tokenizer = get_tokenizer(model)
 
     if tokenizer:
-        return len(tokenizer(text))
+        return len(tokenizer(text, disallowed_special=()))
 
     return estimate_tokens(text)
 
@@ -23,57 +50,68 @@ def estimate_tokens(text: str) -> int:
     return max(1, len(text) // 4)
 
 
-def truncate_text(
+@dataclass
+class TruncateResult:
+    text: str
+    token_count: int
+    truncated: bool = False
+
+
+def _encode(encoding: tiktoken.Encoding, text: str) -> list[int]:
+    return encoding.encode(text, disallowed_special=())
+
+
+def _decode(encoding: tiktoken.Encoding, tokens: list[int]) -> str:
+    # a token slice can end in the middle of a multi-byte character; drop the
+    # partial bytes instead of emitting replacement characters
+    return encoding.decode_bytes(tokens).decode("utf-8", errors="ignore")
+
+
+def fit_tokens(
     text: str,
-    model: str,
     max_tokens: int,
+    model: str = "gpt-4",
     suffix: str = "\n... [truncated]",
     preserve_lines: bool = True,
-):
-    current_tokens = count_tokens(text, model)
-    if current_tokens <= max_tokens:
-        return text
-
-    suffix_tokens = count_tokens(suffix, model)
+    tail_tokens: int = 0,
+) -> TruncateResult:
+    encoding = get_encoding(model)
+    tokens = _encode(encoding, text)
+    if len(tokens) <= max_tokens:
+        return TruncateResult(text, len(tokens))
+
+    suffix_tokens = len(_encode(encoding, suffix))
     target_tokens = max_tokens - suffix_tokens
 
     if target_tokens <= 0:
-        return suffix.strip()
-
-    if preserve_lines:
-        return _truncate_by_lines(text, target_tokens, suffix, model)
-    else:
-        return _truncate_by_chars(text, target_tokens, suffix, model)
-
-
-def _truncate_by_lines(text: str, target_tokens: int, suffix: str, model: str) -> str:
-    lines = text.split("\n")
-    result_lines: list[str] = []
-    current_tokens = 0
-
-    for line in lines:
-        line_tokens = count_tokens(line + "\n", model)
-        if current_tokens + line_tokens > target_tokens:
-            break
-        result_lines.append(line)
-        current_tokens += line_tokens
+        return TruncateResult(suffix.strip(), suffix_tokens, truncated=True)
 
-    if not result_lines:
-        # Fall back to character truncation if no complete lines fit
-        return _truncate_by_chars(text, target_tokens, suffix, model)
+    tail_tokens = min(max(tail_tokens, 0), target_tokens)
+    head_tokens = target_tokens - tail_tokens
 
-    return "\n".join(result_lines) + suffix
+    head = _decode(encoding, tokens[:head_tokens])
+    if preserve_lines:
+        cut = head.rfind("\n")
+        if cut > 0:
+            head = head[:cut]
 
+    tail = ""
+    if tail_tokens:
+        tail = _decode(encoding, tokens[len(tokens) - tail_tokens:])
+        if preserve_lines:
+            cut = tail.find("\n")
+            if 0 <= cut < len(tail) - 1:
+                tail = tail[cut + 1:]
 
-def _truncate_by_chars(text: str, target_tokens: int, suffix: str, model: str) -> str:
-    # Binary search for the right length
-    low, high = 0, len(text)
+    return TruncateResult(head + suffix + tail, target_tokens + suffix_tokens, truncated=True)
 
-    while low < high:
-        mid = (low + high + 1) // 2
-        if count_tokens(text[:mid], model) <= target_tokens:
-            low = mid
-        else:
-            high = mid - 1
 
-    return text[:low] + suffix
\ No newline at end of file
+def truncate_text(
+    text: str,
+    max_tokens: int,
+    model: str = "gpt-4",
+    suffix: str = "\n... [truncated]",
+    preserve_lines: bool = True,
+    tail_tokens: int = 0,
+) -> str:
+    return fit_tokens(text, max_tokens, model, suffix, preserve_lines, tail_tokens).text
@@ -0,0 +1,219 @@
+from __future__ import annotations
+# Minimal span tracing written as OTLP/JSON (one ExportTraceServiceRequest per
+# line, the format of the OpenTelemetry collector's file exporter), so traces
+# can be loaded into any OTel backend without depending on the OTel SDK.
+import atexit
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "cody"
+
+
+def _attribute(key : str, value : Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    elif isinstance(value, (list, tuple)):
+        typed = {"arrayValue": {"values": [_attribute("", item)["value"] for item in value]}}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Span:
+
+    __slots__ = ("tracer", "name", "kind", "trace_id", "span_id", "parent_id",
+                 "start_ns", "end_ns", "attributes", "events", "error")
+
+    def __init__(self, tracer : Tracer, name : str, parent : Optional[Span] = None,
+                 kind : str = "INTERNAL", attributes : Optional[dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns : Optional[int] = None
+        self.attributes : dict[str, Any] = attributes or {}
+        self.events : list[tuple[str, int, dict[str, Any]]] = []
+        self.error : Optional[str] = None
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    def child(self, name : str, kind : str = "INTERNAL", **attributes) -> Span:
+        return Span(self.tracer, name, parent=self, kind=kind, attributes=attributes)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key : str, amount : float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def event(self, name : str, **attributes) -> None:
+        self.events.append((name, time.time_ns(), attributes))
+
+    def set_error(self, message : str) -> None:
+        self.error = message
+
+    def elapsed_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._finish(self)
+
+    def __enter__(self) -> Span:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_val is not None and self.error is None:
+            self.set_error(f"{exc_type.__name__} : {exc_val}")
+        self.end()
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            "events": [{"name": name, "timeUnixNano": str(at),
+                        "attributes": [_attribute(key, value) for key, value in attributes.items()]}
+                       for name, at, attributes in self.events],
+            "status": ({"code": "STATUS_CODE_ERROR", "message": self.error} if self.error
+                       else {"code": "STATUS_CODE_OK"}),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan(Span):
+    # what every span is when tracing is off: no ids, no clock reads
+
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+    @property
+    def recording(self) -> bool:
+        return False
+
+    def child(self, name : str, kind : str = "INTERNAL", **attributes) -> Span:
+        return self
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def add(self, key : str, amount : float) -> None:
+        pass
+
+    def event(self, name : str, **attributes) -> None:
+        pass
+
+    def set_error(self, message : str) -> None:
+        pass
+
+    def elapsed_ms(self) -> float:
+        return 0.0
+
+    def end(self) -> None:
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+
+    # finished spans are written when their trace's root span ends, or once
+    # this many are waiting
+    MAX_BUFFERED_SPANS = 512
+
+    def __init__(self, path : Optional[Path] = None):
+        self.path = path
+        self._finished : list[Span] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def start_span(self, name : str, parent : Optional[Span] = None, kind : str = "INTERNAL",
+                   **attributes) -> Span:
+        if parent is not None:
+            return parent.child(name, kind=kind, **attributes)
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, kind=kind, attributes=attributes)
+
+    def _finish(self, span : Span) -> None:
+        with self._lock:
+            self._finished.append(span)
+            full = len(self._finished) >= self.MAX_BUFFERED_SPANS
+        if span.parent_id is None or full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            spans, self._finished = self._finished, []
+        if not spans or self.path is None:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME),
+                                        _attribute("process.pid", os.getpid())]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME},
+                            "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write trace to {self.path} : {e}")
+
+
+_tracer : Optional[Tracer] = None
+
+
+def configure_tracing(path : Optional[Path]) -> Tracer:
+    global _tracer
+    if _tracer is not None:
+        _tracer.flush()
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    # CODY_TRACE_FILE turns tracing on without touching the CLI
+    if _tracer is None:
+        path = os.environ.get("CODY_TRACE_FILE")
+        configure_tracing(Path(path).expanduser() if path else None)
+    return _tracer
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if _tracer is not None:
+        _tracer.flush()
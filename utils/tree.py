@@ -0,0 +1,195 @@
+from __future__ import annotations
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+from utils.ignore import GitIgnore, glob_to_regex
+
+
+@dataclass
+class DirNode:
+    path : Path
+    relative : str
+    parent_ignore : GitIgnore
+    ignore : GitIgnore | None = None
+    mtime_ns : int = -1
+    gitignore_mtime_ns : int = -1
+    files : dict[str, os.stat_result] = field(default_factory=dict)
+    dirs : dict[str, DirNode] = field(default_factory=dict)
+
+
+class WorkspaceSnapshot:
+    
+    # within this window listings are served without touching the disk at all
+    REFRESH_INTERVAL = float(os.environ.get("CODY_TREE_REFRESH_SECONDS", 1.0))
+    
+    def __init__(self, root : Path):
+        self.root = root
+        self._root_node : DirNode | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.scans = 0
+        # bumped whenever a listing or a file stat may have changed
+        self.version = 0
+        
+    def _child_relative(self, node : DirNode, name : str) -> str:
+        return f"{node.relative}/{name}" if node.relative else name
+    
+    def _scan(self, node : DirNode, stat : os.stat_result) -> None:
+        # re-read one directory; subdirectories that still exist keep their
+        # nodes and are validated separately
+        self.scans += 1
+        self.version += 1
+        node.mtime_ns = stat.st_mtime_ns
+        files, dirs = {}, {}
+        try:
+            entries = list(os.scandir(node.path))
+        except OSError:
+            entries = []
+        for entry in entries:
+            relative = self._child_relative(node, entry.name)
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if node.ignore.is_ignored(relative, is_dir):
+                    continue
+                if is_dir:
+                    dirs[entry.name] = node.dirs.get(entry.name) or DirNode(Path(entry.path), relative, node.ignore)
+                elif entry.is_file():
+                    files[entry.name] = entry.stat()
+            except OSError:
+                continue
+        node.files = files
+        node.dirs = dirs
+        
+    def _validate(self, node : DirNode) -> None:
+        try:
+            stat = node.path.stat()
+        except OSError:
+            node.files, node.dirs = {}, {}
+            return
+        
+        gitignore = node.path / ".gitignore"
+        try:
+            gitignore_mtime_ns = gitignore.stat().st_mtime_ns
+        except OSError:
+            gitignore_mtime_ns = -1
+        if node.ignore is None or gitignore_mtime_ns != node.gitignore_mtime_ns:
+            # rules changed: everything below has to be filtered again
+            node.ignore = node.parent_ignore.child(node.path, node.relative)
+            node.gitignore_mtime_ns = gitignore_mtime_ns
+            node.dirs = {}
+            node.mtime_ns = -1
+            
+        if stat.st_mtime_ns != node.mtime_ns:
+            self._scan(node, stat)
+        for child in node.dirs.values():
+            self._validate(child)
+            
+    def refresh(self, force : bool = False) -> DirNode:
+        with self._lock:
+            now = time.monotonic()
+            if self._root_node is None:
+                self._root_node = DirNode(self.root, "", GitIgnore())
+                force = True
+            if force or now - self._checked_at >= self.REFRESH_INTERVAL:
+                self._validate(self._root_node)
+                self._checked_at = time.monotonic()
+            return self._root_node
+        
+    def restat(self) -> int:
+        # edits in place leave the directory mtime alone, so callers that
+        # must not miss them (the grep index) re-read every file's stat;
+        # the version only moves when something actually changed
+        root = self.refresh()
+        with self._lock:
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                files, changed = {}, False
+                for name, old in node.files.items():
+                    try:
+                        stat = os.stat(node.path / name)
+                    except OSError:
+                        changed = True
+                        continue
+                    files[name] = stat
+                    changed = changed or stat.st_mtime_ns != old.st_mtime_ns or stat.st_size != old.st_size
+                if changed:
+                    node.files = files
+                    self.version += 1
+                stack.extend(node.dirs.values())
+            return self.version
+        
+    def find(self, relative : str) -> DirNode | None:
+        node = self.refresh()
+        for part in [part for part in relative.split("/") if part and part != "."]:
+            node = node.dirs.get(part)
+            if node is None:
+                return None
+        return node
+    
+    def iter_files(self, relative : str = "") -> Iterator[tuple[str, os.stat_result]]:
+        start = self.find(relative)
+        if start is None:
+            return
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for name in sorted(node.files):
+                yield self._child_relative(node, name), node.files[name]
+            stack.extend(node.dirs[name] for name in sorted(node.dirs, reverse=True))
+            
+    def glob(self, pattern : str, relative : str = "") -> list[tuple[str, os.stat_result]]:
+        # pattern is matched against paths relative to `relative`
+        regex = re.compile(glob_to_regex(pattern, anchored=True))
+        prefix = f"{relative.strip('/')}/" if relative.strip("/. ") else ""
+        return [(path, stat) for path, stat in self.iter_files(relative)
+                if regex.match(path[len(prefix):])]
+
+
+# least recently used last; searches outside the workspace each add one
+MAX_SNAPSHOTS = int(os.environ.get("CODY_TREE_MAX_SNAPSHOTS", 8))
+_snapshots : OrderedDict[Path, WorkspaceSnapshot] = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+
+def get_workspace_snapshot(root : Path) -> WorkspaceSnapshot:
+    root = root.resolve()
+    with _snapshots_lock:
+        snapshot = _snapshots.get(root)
+        if snapshot is None:
+            snapshot = _snapshots[root] = WorkspaceSnapshot(root)
+            while len(_snapshots) > MAX_SNAPSHOTS:
+                _snapshots.popitem(last=False)
+        else:
+            _snapshots.move_to_end(root)
+        return snapshot
+
+
+def in_workspace(cwd : Path, target : Path) -> bool:
+    cwd, target = cwd.resolve(), target.resolve()
+    return target == cwd or cwd in target.parents
+
+
+def snapshot_for(cwd : Path, target : Path) -> tuple[WorkspaceSnapshot, str]:
+    # reuse the workspace snapshot when the target lives inside it
+    cwd, target = cwd.resolve(), target.resolve()
+    if in_workspace(cwd, target):
+        relative = target.relative_to(cwd).as_posix()
+        return get_workspace_snapshot(cwd), "" if relative == "." else relative
+    return get_workspace_snapshot(target), ""
+
+
+def list_directory(path : Path) -> DirNode:
+    # a single scandir of one directory, for listings outside the workspace
+    # that should not pay for a recursive snapshot
+    path = path.resolve()
+    node = DirNode(path, "", GitIgnore())
+    node.ignore = node.parent_ignore.child(path, "")
+    WorkspaceSnapshot(path)._scan(node, path.stat())
+    return node
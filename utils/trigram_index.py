@@ -0,0 +1,346 @@
+from __future__ import annotations
+# Trigram index for grep. Postings live in immutable segment files, each a
+# sorted table of trigram ids followed by their sorted uint32 doc-id arrays,
+# read through mmap. Every update appends a delta segment plus a small JSON
+# doc table (doc id -> path, mtime, size); a file that changes gets a new doc
+# id and its old one is simply no longer live. The manifest lists the
+# segments in order and is the only file ever replaced.
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Iterable
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = Path(os.environ.get("CODY_CACHE_DIR", Path.home() / ".cache" / "cody")) / "trigrams"
+# larger files are not indexed and are always searched
+MAX_INDEXED_FILE_BYTES = 2 * 1024 * 1024
+_FORMAT_VERSION = 3
+
+
+def _trigram_id(data : bytes, i : int) -> int:
+    return (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+
+
+def file_trigrams(path : str) -> bytes | None:
+    # runs in worker processes; returns the sorted trigram ids of the
+    # lower-cased file content as raw array bytes
+    try:
+        with open(path, "rb") as f:
+            data = f.read(MAX_INDEXED_FILE_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_INDEXED_FILE_BYTES or b"\x00" in data[:8192]:
+        return None
+    data = data.lower()
+    ids = {_trigram_id(data, i) for i in range(len(data) - 2)}
+    return array('I', sorted(ids)).tobytes()
+
+
+def literal_trigrams(text : str) -> set[int]:
+    data = text.encode("utf-8").lower()
+    return {_trigram_id(data, i) for i in range(len(data) - 2)}
+
+
+def required_literals(pattern : str) -> list[str]:
+    # literal runs that every match must contain; alternations and anything
+    # we cannot reason about simply contribute nothing
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, sre_constants.error, RecursionError):
+        return []
+    
+    literals, current = [], []
+    
+    def flush():
+        if len(current) >= 3:
+            literals.append("".join(current))
+        current.clear()
+        
+    def walk(items):
+        for op, value in items:
+            if op is sre_constants.LITERAL and value < 128:
+                current.append(chr(value))
+            elif op is sre_constants.SUBPATTERN and value[-1] is not None:
+                walk(value[-1])
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and value[0] >= 1:
+                flush()
+                walk(value[2])
+                flush()
+            else:
+                flush()
+    walk(parsed)
+    flush()
+    return literals
+
+
+class _Segment:
+    # header | postings | keys | offsets, all native uint32; postings[offsets[i]:offsets[i + 1]]
+    # are the sorted doc ids containing keys[i]
+    MAGIC = b"CTRI"
+    HEADER = struct.Struct("=4sIII")
+    
+    def __init__(self, name : str, path : Path, doc_ids : array, removed : list[str]):
+        self.name = name
+        self.path = path
+        # doc ids listed in this segment's doc table, live or not
+        self.doc_ids = doc_ids
+        self.removed = removed
+        self._keys = self._offsets = self._postings = None
+        
+    def _open(self) -> None:
+        with open(self.path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_keys, n_postings = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"Bad trigram segment {self.path}")
+        view = memoryview(data)[self.HEADER.size:].cast("I")
+        self._postings = view[:n_postings]
+        self._keys = view[n_postings:n_postings + n_keys]
+        self._offsets = view[n_postings + n_keys:n_postings + 2 * n_keys + 1]
+        
+    def keys(self) -> memoryview:
+        if self._keys is None:
+            self._open()
+        return self._keys
+        
+    def lookup(self, trigram : int) -> memoryview:
+        keys = self.keys()
+        i = bisect.bisect_left(keys, trigram)
+        if i == len(keys) or keys[i] != trigram:
+            return self._postings[:0]
+        return self._postings[self._offsets[i]:self._offsets[i + 1]]
+    
+    @classmethod
+    def write(cls, path : Path, postings : Iterable[tuple[int, array]]) -> None:
+        # postings must come in trigram order; they are streamed to disk and
+        # only the key and offset tables are held until the end
+        keys, offsets = array('I'), array('I', [0])
+        with open(path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, _FORMAT_VERSION, 0, 0))
+            for trigram, doc_ids in postings:
+                if not doc_ids:
+                    continue
+                doc_ids.tofile(f)
+                keys.append(trigram)
+                offsets.append(offsets[-1] + len(doc_ids))
+            keys.tofile(f)
+            offsets.tofile(f)
+            f.seek(0)
+            f.write(cls.HEADER.pack(cls.MAGIC, _FORMAT_VERSION, len(keys), offsets[-1]))
+            
+
+class TrigramIndex:
+    
+    MANIFEST_FILE = "manifest.json"
+    # files per segment when (re)indexing many at once, which bounds the
+    # postings held in memory while a segment is built
+    SEGMENT_DOCS = 8192
+    # past this many segments the small ones are merged together
+    MAX_SEGMENTS = 16
+    
+    def __init__(self, root : Path):
+        self.root = root
+        self.directory = INDEX_DIR / hashlib.sha1(str(root).encode()).hexdigest()
+        self._segments : list[_Segment] = []
+        self._next_doc = 0
+        # live files only: relative path -> (doc id, mtime_ns, size)
+        self._docs : dict[str, tuple[int, int, int]] = {}
+        self._paths : dict[int, str] = {}
+        self._unindexed : set[str] = set()
+        self._lock = threading.Lock()
+        # WorkspaceSnapshot.version the index was last checked against
+        self.snapshot_version = -1
+        
+    @classmethod
+    def load(cls, root : Path) -> TrigramIndex:
+        # reads the manifest and doc tables only; postings are mapped the
+        # first time a segment is searched
+        index = cls(root)
+        # the pickled index of earlier versions
+        index.directory.with_suffix(".pickle").unlink(missing_ok=True)
+        try:
+            manifest = json.loads((index.directory / cls.MANIFEST_FILE).read_text())
+            if manifest["version"] != _FORMAT_VERSION:
+                return index
+            for name in manifest["segments"]:
+                table = json.loads((index.directory / f"{name}.docs").read_text())
+                index._add_segment(name, table["docs"], table["removed"])
+            index._next_doc = manifest["next_doc"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Discarding trigram index for {root} : {e}")
+            index = cls(root)
+        return index
+    
+    def _add_segment(self, name : str, docs : list[list], removed : list[str]) -> None:
+        for relative in removed:
+            self._drop(relative)
+        for doc_id, relative, mtime_ns, size, indexed in docs:
+            self._drop(relative)
+            self._docs[relative] = (doc_id, mtime_ns, size)
+            self._paths[doc_id] = relative
+            if not indexed:
+                self._unindexed.add(relative)
+        self._segments.append(_Segment(name, self.directory / f"{name}.post",
+                                       array('I', (doc[0] for doc in docs)), removed))
+        
+    def _drop(self, relative : str) -> None:
+        known = self._docs.pop(relative, None)
+        if known is not None:
+            del self._paths[known[0]]
+            self._unindexed.discard(relative)
+            
+    def stale(self, files : Iterable[tuple[str, os.stat_result]]) -> tuple[list[str], list[str]]:
+        # (changed or new files, files that no longer exist)
+        seen, changed = set(), []
+        with self._lock:
+            for relative, stat in files:
+                seen.add(relative)
+                known = self._docs.get(relative)
+                if known is None or known[1] != stat.st_mtime_ns or known[2] != stat.st_size:
+                    changed.append(relative)
+            removed = [relative for relative in self._docs if relative not in seen]
+        return changed, removed
+    
+    def update(self, entries : dict[str, tuple[int, int, bytes | None]], removed : list[str]) -> None:
+        # writes one delta segment holding only the files that changed
+        if not entries and not removed:
+            return
+        with self._lock:
+            first = self._next_doc
+            self._next_doc += len(entries)
+        docs, postings = [], {}
+        for doc_id, (relative, (mtime_ns, size, raw)) in enumerate(sorted(entries.items()), start=first):
+            docs.append([doc_id, relative, mtime_ns, size, raw is not None])
+            if raw is not None:
+                trigrams = array('I')
+                trigrams.frombytes(raw)
+                for trigram in trigrams:
+                    doc_ids = postings.get(trigram)
+                    if doc_ids is None:
+                        postings[trigram] = doc_ids = array('I')
+                    doc_ids.append(doc_id)
+        name = self._write_segment(((trigram, postings[trigram]) for trigram in sorted(postings)),
+                                   docs, removed)
+        with self._lock:
+            self._add_segment(name, docs, removed)
+            self._write_manifest()
+        self._maybe_merge()
+        
+    def _write_segment(self, postings : Iterable[tuple[int, array]], docs : list[list],
+                       removed : list[str]) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # unique across processes (CLI, daemon, batch) sharing the directory
+        name = f"{time.time_ns():x}-{os.getpid()}"
+        _Segment.write(self.directory / f"{name}.post", postings)
+        table = json.dumps({"docs": docs, "removed": removed}, separators=(",", ":"))
+        (self.directory / f"{name}.docs").write_text(table, encoding="utf-8")
+        return name
+    
+    def _write_manifest(self) -> None:
+        manifest = {"version": _FORMAT_VERSION, "next_doc": self._next_doc,
+                    "segments": [segment.name for segment in self._segments]}
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix="manifest", suffix=".tmp")
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.directory / self.MANIFEST_FILE)
+        
+    def _maybe_merge(self) -> None:
+        # segments that are mostly dead are rewritten; small deltas are only
+        # folded together once there are too many of them
+        with self._lock:
+            dead, small = [], []
+            for segment in self._segments:
+                live = sum(1 for doc_id in segment.doc_ids if doc_id in self._paths)
+                if live * 2 < len(segment.doc_ids):
+                    dead.append(segment)
+                elif len(segment.doc_ids) < self.SEGMENT_DOCS // 2:
+                    small.append(segment)
+            merging = dead + small if len(self._segments) > self.MAX_SEGMENTS and len(small) > 1 else dead
+            if not merging:
+                return
+            docs = []
+            for segment in merging:
+                for doc_id in segment.doc_ids:
+                    relative = self._paths.get(doc_id)
+                    if relative is not None:
+                        _, mtime_ns, size = self._docs[relative]
+                        docs.append([doc_id, relative, mtime_ns, size, relative not in self._unindexed])
+            # a removal still matters while an older, unmerged segment lists the file
+            removed = sorted({relative for segment in merging for relative in segment.removed
+                              if relative not in self._docs})
+            next_doc = self._next_doc
+        live_ids = {doc[0] for doc in docs}
+        
+        def postings():
+            for trigram in sorted(set().union(*(segment.keys() for segment in merging))):
+                parts = [doc_ids for doc_ids in
+                         ([doc_id for doc_id in segment.lookup(trigram) if doc_id in live_ids]
+                          for segment in merging) if doc_ids]
+                if len(parts) == 1:
+                    yield trigram, array('I', parts[0])
+                elif parts:
+                    # doc-id ranges of merged segments may interleave
+                    yield trigram, array('I', sorted(doc_id for part in parts for doc_id in part))
+                    
+        name = self._write_segment(postings(), docs, removed) if docs or removed else None
+        with self._lock:
+            # a delta written meanwhile may supersede what was merged
+            merged = self._next_doc == next_doc and all(segment in self._segments for segment in merging)
+            if merged:
+                self._segments = [segment for segment in self._segments if segment not in merging]
+                if name is not None:
+                    self._add_segment(name, docs, removed)
+                self._write_manifest()
+        obsolete = [segment.name for segment in merging] if merged else [name] if name else []
+        for stem in obsolete:
+            for suffix in (".post", ".docs"):
+                (self.directory / f"{stem}{suffix}").unlink(missing_ok=True)
+        if merged:
+            logger.debug(f"Merged {len(merging)} trigram segments for {self.root}")
+            
+    def candidates(self, pattern : str) -> set[str] | None:
+        # None means the pattern gives us nothing to filter on
+        required = set()
+        for literal in required_literals(pattern):
+            required |= literal_trigrams(literal)
+        if not required:
+            return None
+        
+        with self._lock:
+            segments = list(self._segments)
+        doc_ids : set[int] = set()
+        try:
+            for segment in segments:
+                postings = sorted((segment.lookup(trigram) for trigram in required), key=len)
+                if not postings[0]:
+                    continue
+                found = set(postings[0])
+                for other in postings[1:]:
+                    found.intersection_update(other)
+                    if not found:
+                        break
+                doc_ids |= found
+        except (OSError, ValueError) as e:
+            logger.warning(f"Trigram index for {self.root} unreadable : {e}")
+            return None
+        with self._lock:
+            return {self._paths[doc_id] for doc_id in doc_ids if doc_id in self._paths} | self._unindexed